@@ -1,25 +1,141 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Header, Response, Cookie
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Header, Response, Cookie, UploadFile, File
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field, EmailStr, field_validator
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReplaceOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pydantic import BaseModel, Field, EmailStr, ValidationError, field_validator
+import pydantic_core
 from typing import Optional, List, Literal
 from datetime import datetime, timezone, timedelta
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 import os
+import asyncio
+import bisect
+import calendar
+import inspect
 import logging
 import uuid
 import re
+import json
+import base64
+import csv
+import io
+import hashlib
+import hmac
+import time
+import urllib.parse
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
 from pathlib import Path
 import httpx
+from cachetools import TTLCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+class RequestMetrics:
+    """DB and outbound accounting for one in-flight HTTP request.
+
+    The Mongo listener runs on Motor's executor threads (with the request's
+    context copied in), so DB counters are updated under a lock.
+    """
+    MAX_QUERY_SHAPES = 50
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.outbound_seconds = {}
+        self.query_shapes = {}
+        self._lock = threading.Lock()
+
+    def record_db(self, shape: Optional[str], seconds: float):
+        with self._lock:
+            self.db_calls += 1
+            self.db_seconds += seconds
+            if shape is not None and (shape in self.query_shapes or len(self.query_shapes) < self.MAX_QUERY_SHAPES):
+                self.query_shapes[shape] = self.query_shapes.get(shape, 0) + 1
+
+    def record_outbound(self, dependency: str, seconds: float):
+        self.outbound_seconds[dependency] = self.outbound_seconds.get(dependency, 0.0) + seconds
+
+current_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar('current_request_metrics', default=None)
+
+QUERY_SHAPE_FIELDS = {
+    'find': ('filter', 'sort'),
+    'aggregate': ('pipeline',),
+    'count': ('query',),
+    'distinct': ('key', 'query'),
+    'findAndModify': ('query', 'sort'),
+    'update': ('updates',),
+    'delete': ('deletes',),
+}
+QUERY_SHAPE_MAX_LENGTH = 300
+
+def value_shape(value):
+    """Strip literals from a query document, keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: value_shape(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, dict) for v in value):
+        return [value_shape(v) for v in value]
+    return '?'
+
+def query_shape(command_name: str, command) -> str:
+    shape = {}
+    for field in QUERY_SHAPE_FIELDS.get(command_name, ()):
+        if field in command:
+            # bulk update/delete batches repeat one statement shape; the first is enough
+            value = command[field][:1] if field in ('updates', 'deletes') else command[field]
+            shape[field] = value_shape(value) if field != 'key' else command[field]
+    text = f"{command_name} {command.get(command_name)} {json.dumps(shape, default=str, separators=(',', ':'))}"
+    return text[:QUERY_SHAPE_MAX_LENGTH]
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every Mongo command by name and charges it to the in-flight request, if any"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shapes = {}
+        self.latency = {}
+
+    def started(self, event):
+        if current_request_metrics.get() is not None:
+            with self._lock:
+                self._shapes[(event.connection_id, event.request_id)] = query_shape(event.command_name, event.command)
+
+    def _finished(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        with self._lock:
+            shape = self._shapes.pop((event.connection_id, event.request_id), None)
+            histogram = self.latency.get(event.command_name)
+            if histogram is None:
+                histogram = self.latency[event.command_name] = LatencyHistogram()
+            histogram.observe(seconds, error=failed)
+        metrics = current_request_metrics.get()
+        if metrics is not None:
+            metrics.record_db(shape, seconds)
+
+    def histograms(self) -> list:
+        with self._lock:
+            return sorted(self.latency.items())
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+mongo_command_listener = MongoCommandListener()
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_command_listener])
 db = client[os.environ['DB_NAME']]
 
 app = FastAPI()
@@ -30,6 +146,49 @@ logger = logging.getLogger(__name__)
 
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
+AUTH_SESSION_DATA_URL = 'https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data'
+HTTP_POOL_MAX_CONNECTIONS = int(os.environ.get('HTTP_POOL_MAX_CONNECTIONS', '100'))
+HTTP_POOL_MAX_KEEPALIVE = int(os.environ.get('HTTP_POOL_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '10'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', '60'))
+SESSION_CACHE_MAXSIZE = int(os.environ.get('SESSION_CACHE_MAXSIZE', '10000'))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '30'))
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'emergent')
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '8'))
+FAKE_LLM_LATENCY_MS = int(os.environ.get('FAKE_LLM_LATENCY_MS', '0'))
+VALIDATION_WORKERS = int(os.environ.get('VALIDATION_WORKERS', '4'))
+VALIDATION_MAX_ATTEMPTS = int(os.environ.get('VALIDATION_MAX_ATTEMPTS', '5'))
+VALIDATION_RETRY_BASE = float(os.environ.get('VALIDATION_RETRY_BASE', '2'))
+VALIDATION_RETRY_MAX = float(os.environ.get('VALIDATION_RETRY_MAX', '300'))
+VALIDATION_JOB_LEASE = int(os.environ.get('VALIDATION_JOB_LEASE', '120'))
+# Capped at half the lease so a slow call (semaphore wait included) gives up before its job can be reclaimed
+VALIDATION_LLM_TIMEOUT = min(float(os.environ.get('VALIDATION_LLM_TIMEOUT', '60')), VALIDATION_JOB_LEASE / 2)
+VALIDATION_POLL_INTERVAL = float(os.environ.get('VALIDATION_POLL_INTERVAL', '5'))
+VALIDATION_CACHE_MAXSIZE = int(os.environ.get('VALIDATION_CACHE_MAXSIZE', '5000'))
+VALIDATION_CACHE_TTL = int(os.environ.get('VALIDATION_CACHE_TTL', '86400'))
+# Opt-in: coupons worth up to this much may skip the LLM when no rule flags them; 0 disables
+PRESCREEN_AUTO_APPROVE_MAX_VALUE = float(os.environ.get('PRESCREEN_AUTO_APPROVE_MAX_VALUE', '0'))
+ANALYTICS_RECONCILE_INTERVAL = int(os.environ.get('ANALYTICS_RECONCILE_INTERVAL', '0'))
+RATING_RECONCILE_INTERVAL = int(os.environ.get('RATING_RECONCILE_INTERVAL', '3600'))
+MAX_PAGE_SIZE = 200
+ADMIN_MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+BULK_UPLOAD_MAX_ROWS = int(os.environ.get('BULK_UPLOAD_MAX_ROWS', '10000'))
+BULK_UPLOAD_MAX_BYTES = int(os.environ.get('BULK_UPLOAD_MAX_BYTES', str(16 * 1024 * 1024)))
+BULK_UPLOAD_CHUNK_SIZE = int(os.environ.get('BULK_UPLOAD_CHUNK_SIZE', '500'))
+BULK_UPLOAD_CONCURRENCY = int(os.environ.get('BULK_UPLOAD_CONCURRENCY', '16'))
+COUPON_EXPIRY_SWEEP_INTERVAL = int(os.environ.get('COUPON_EXPIRY_SWEEP_INTERVAL', '300'))
+COUPON_EXPIRY_SWEEP_BATCH_SIZE = int(os.environ.get('COUPON_EXPIRY_SWEEP_BATCH_SIZE', '1000'))
+WALLET_SETTLE_MAX_BATCH = int(os.environ.get('WALLET_SETTLE_MAX_BATCH', '1000'))
+WALLET_RECOVERY_INTERVAL = int(os.environ.get('WALLET_RECOVERY_INTERVAL', '60'))
+WALLET_RECOVERY_GRACE = int(os.environ.get('WALLET_RECOVERY_GRACE', '60'))
+# Bearer token a metrics scraper can use instead of an admin session; unset means admin sessions only
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '1000'))
+DB_INDEX_SELF_CHECK = os.environ.get('DB_INDEX_SELF_CHECK', 'false').lower() in ('1', 'true', 'yes')
 
 class User(BaseModel):
     user_id: str
@@ -55,9 +214,14 @@ class Coupon(BaseModel):
     coupon_value: float
     asking_price: float
     proof_image_url: Optional[str] = None
-    status: Literal['pending', 'approved', 'rejected', 'sold'] = 'pending'
+    status: Literal['pending', 'approved', 'rejected', 'sold', 'expired'] = 'pending'
     ai_risk_score: Optional[str] = None
     ai_feedback: Optional[str] = None
+    expires_at: Optional[datetime] = None
+    rating: Optional[float] = None
+    review_count: int = 0
+    seller_rating: Optional[float] = None
+    seller_review_count: int = 0
     created_at: datetime
     updated_at: datetime
 
@@ -70,7 +234,7 @@ class CouponCreate(BaseModel):
     proof_image_url: Optional[str] = None
 
 class CouponUpdate(BaseModel):
-    status: Optional[Literal['pending', 'approved', 'rejected', 'sold']] = None
+    status: Optional[Literal['pending', 'approved', 'rejected', 'sold', 'expired']] = None
 
 class Transaction(BaseModel):
     transaction_id: str
@@ -139,13 +303,447 @@ class Wallet(BaseModel):
     updated_at: datetime
 
 class WithdrawRequest(BaseModel):
+    amount: float = Field(..., gt=0, allow_inf_nan=False)
+    upi_id: Optional[str] = None
+    bank_account: Optional[str] = None
+
+class Withdrawal(BaseModel):
+    withdrawal_id: str
+    user_id: str
     amount: float
     upi_id: Optional[str] = None
     bank_account: Optional[str] = None
+    status: Literal['pending', 'paid', 'rejected'] = 'pending'
+    created_at: datetime
+    settled_at: Optional[datetime] = None
+
+class WithdrawalSettlement(BaseModel):
+    withdrawal_ids: List[str] = Field(..., min_length=1)
+    status: Literal['paid', 'rejected']
+
+class LedgerEntry(BaseModel):
+    entry_id: str
+    user_id: str
+    kind: Literal['opening_balance', 'sale', 'withdrawal', 'withdrawal_reversal']
+    amount: float
+    ref_id: str
+    created_at: datetime
 
 class SessionDataRequest(BaseModel):
     session_id: str
 
+def normalize_brand(brand_name: str) -> str:
+    return brand_name.strip().lower()
+
+def derived_coupon_fields(brand_name: str, coupon_value: float, asking_price: float) -> dict:
+    """Denormalized fields that let listing filters and sorts run off an index"""
+    return {
+        'brand_key': normalize_brand(brand_name),
+        'discount_ratio': coupon_value / asking_price if asking_price > 0 else 0.0
+    }
+
+CODE_PREFIX_LENGTH = 6
+LIVE_COUPON_STATUSES = ['pending', 'approved', 'sold']
+
+def normalize_coupon_code(coupon_code: str) -> str:
+    return re.sub(r'[\s_-]', '', coupon_code).upper()
+
+def mask_coupon_code(coupon_code: str) -> str:
+    return '****' + coupon_code[-4:] if len(coupon_code) > 4 else '****'
+
+def code_fingerprint_fields(coupon_code: str) -> dict:
+    """Hashed fingerprint for exact-duplicate lookups, a short prefix for near-duplicates and the public masked code"""
+    normalized = normalize_coupon_code(coupon_code)
+    return {
+        'code_fingerprint': hashlib.sha256(normalized.encode('utf-8')).hexdigest(),
+        'code_prefix': normalized[:CODE_PREFIX_LENGTH],
+        'masked_code': mask_coupon_code(coupon_code)
+    }
+
+def live_fingerprint_update(status: str, code_fingerprint: str) -> dict:
+    """live_fingerprint is unique and only present while the status is live, so the index rejects a second live copy of a code"""
+    if status in LIVE_COUPON_STATUSES:
+        return {'$set': {'live_fingerprint': code_fingerprint}}
+    return {'$unset': {'live_fingerprint': ''}}
+
+def is_live_code_conflict(error: dict) -> bool:
+    return 'live_fingerprint' in str(error.get('keyPattern') or error.get('errmsg', ''))
+
+def response_projection(model) -> dict:
+    """Mongo projection returning exactly the fields model serializes"""
+    return {'_id': 0, **{name: 1 for name in model.model_fields}}
+
+# The plaintext code only leaves the database for sold coupons
+PUBLIC_COUPON_PROJECTION = {
+    **response_projection(Coupon),
+    'coupon_code': {'$cond': [{'$eq': ['$status', 'sold']}, '$coupon_code', {'$ifNull': ['$masked_code', '****']}]}
+}
+
+_response_defaults = {}
+
+def response_rows(model, docs: List[dict]) -> List[dict]:
+    """Rows in model field order, with model defaults for optional fields a stored row lacks"""
+    defaults = _response_defaults.get(model)
+    if defaults is None:
+        defaults = _response_defaults[model] = {
+            name: field.get_default(call_default_factory=True)
+            for name, field in model.model_fields.items()
+            if not field.is_required()
+        }
+    fields = model.model_fields
+    return [{name: doc[name] if name in doc else defaults[name] for name in fields} for doc in docs]
+
+def dump_response(model, docs) -> bytes:
+    """JSON-encode rows read from Mongo in model's response shape without building model instances.
+
+    Stored rows were written through these models, so validating them again
+    on the way out only costs time; pydantic-core encodes the plain dicts
+    (datetimes included) in one pass.
+    """
+    if isinstance(docs, list):
+        return pydantic_core.to_json(response_rows(model, docs))
+    return pydantic_core.to_json(response_rows(model, [docs])[0])
+
+def json_rows_response(model, docs, headers: Optional[dict] = None) -> Response:
+    return Response(content=dump_response(model, docs), media_type='application/json', headers=headers)
+
+# sort name -> (field, direction); coupon_id breaks ties in the same direction
+COUPON_SORTS = {
+    'newest': ('created_at', DESCENDING),
+    'price_asc': ('asking_price', ASCENDING),
+    'price_desc': ('asking_price', DESCENDING),
+    'discount': ('discount_ratio', DESCENDING),
+    'expiring': ('expires_at', ASCENDING),
+}
+
+PRICE_FACET_BOUNDARIES = [0, 10, 25, 50, 100, 250]
+DISCOUNT_FACET_PERCENTS = [0, 10, 25, 50, 75]
+BRAND_FACET_LIMIT = 20
+MAX_SEARCH_OFFSET = 1000
+
+def discount_ratio_for(percent_off: float) -> float:
+    """discount_ratio (value / price) equivalent to a percent-off threshold"""
+    return 1 / (1 - percent_off / 100)
+
+def facet_buckets(rows: List[dict], boundaries: List[float], label) -> List[dict]:
+    """Turn $bucket output into one {min, max, count} entry per bucket, empty ones included"""
+    counts = {row['_id']: row['count'] for row in rows}
+    return [
+        {**label(lower, upper), 'count': counts.get(lower, 0)}
+        for lower, upper in zip(boundaries, boundaries[1:])
+    ]
+
+def encode_cursor(sort: str, doc: dict, field: str, id_field: str) -> str:
+    value = doc[field]
+    if isinstance(value, datetime):
+        value = {'$date': value.isoformat()}
+    payload = json.dumps({'s': sort, 'v': value, 'id': doc[id_field]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(sort: str, cursor: str, field: str, direction: int, id_field: str) -> dict:
+    """Turn an opaque cursor back into a keyset filter for the next page"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        value = payload['v']
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value['$date'])
+        last_id = payload['id']
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if payload.get('s') != sort:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+    
+    op = '$gt' if direction == ASCENDING else '$lt'
+    return {'$or': [{field: {op: value}}, {field: value, id_field: {op: last_id}}]}
+
+async def fetch_keyset_page(collection, query: dict, sort: str, field: str, direction: int, id_field: str,
+                            cursor: Optional[str], limit: int, projection: Optional[dict] = None) -> tuple:
+    """One page ordered by (field, id_field); returns (docs, cursor for the next page or None).
+
+    projection may use aggregation expressions; sort keys it leaves out are
+    fetched for the cursor and dropped from the returned docs.
+    """
+    if cursor:
+        query = {'$and': [query, decode_cursor(sort, cursor, field, direction, id_field)]}
+    
+    projection = projection or {'_id': 0}
+    hidden = [key for key in (field, id_field) if len(projection) > 1 and key not in projection]
+    docs = await collection.aggregate([
+        {'$match': query},
+        {'$sort': {field: direction, id_field: direction}},
+        {'$limit': limit + 1},
+        {'$project': {**projection, **{key: 1 for key in hidden}}}
+    ]).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort, docs[-1], field, id_field)
+    for doc in docs if hidden else ():
+        for key in hidden:
+            doc.pop(key, None)
+    return docs, next_cursor
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def stream_export(collection, query: dict, sort: list, fields: List[str], export_format: str, filename: str) -> StreamingResponse:
+    """Stream every matching document as NDJSON or CSV, one Motor batch at a time"""
+    cursor = collection.find(query, {'_id': 0, **{f: 1 for f in fields}}).sort(sort).batch_size(EXPORT_BATCH_SIZE)
+    
+    def encode(rows: list) -> str:
+        if export_format == 'ndjson':
+            return ''.join(json.dumps({f: export_value(row.get(f)) for f in fields}) + '\n' for row in rows)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([[export_value(row.get(f)) for f in fields] for row in rows])
+        return buffer.getvalue()
+    
+    async def body():
+        if export_format == 'csv':
+            header = io.StringIO()
+            csv.writer(header).writerow(fields)
+            yield header.getvalue()
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield encode(batch)
+                batch = []
+        if batch:
+            yield encode(batch)
+    
+    media_type = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+def created_range(created_after: Optional[datetime], created_before: Optional[datetime]) -> dict:
+    bounds = {}
+    if created_after:
+        bounds['$gte'] = created_after
+    if created_before:
+        bounds['$lt'] = created_before
+    return {'created_at': bounds} if bounds else {}
+
+class SessionCache:
+    """Bounded TTL/LRU cache of session token -> resolved User.
+
+    Entries never outlive the session itself. A reverse user_id -> tokens
+    index lets write paths drop every cached session of a user whose row
+    changed. Each invalidate_user also bumps the user's generation, and put
+    drops a User read under an older one, so a lookup that raced the write
+    cannot cache the old row again.
+
+    Invalidation is per-process: other workers keep their copy until its TTL
+    runs out, so reads that must see writes from elsewhere go to the row.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._tokens_by_user = {}
+        # Kept for the TTL, which outlasts any lookup an invalidation could race
+        self._generations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._cache.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at < datetime.now(timezone.utc):
+                self._cache.pop(token, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return user
+
+    def generation(self, user_id: str) -> int:
+        """Read before fetching a user row and pass to put"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, token: str, user: User, expires_at: datetime, generation: int):
+        with self._lock:
+            if self._generations.get(user.user_id, 0) != generation:
+                return
+            self._cache[token] = (user, expires_at)
+            self._tokens_by_user.setdefault(user.user_id, set()).add(token)
+            if len(self._tokens_by_user) > 2 * self._cache.maxsize:
+                self._prune_reverse_index()
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            entry = self._cache.pop(token, None)
+            if entry is not None:
+                self.invalidations += 1
+                self._tokens_by_user.get(entry[0].user_id, set()).discard(token)
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for token in self._tokens_by_user.pop(user_id, set()):
+                if self._cache.pop(token, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._tokens_by_user.clear()
+            self._generations.clear()
+
+    def _prune_reverse_index(self):
+        live = {}
+        for token, (user, _) in self._cache.items():
+            live.setdefault(user.user_id, set()).add(token)
+        self._tokens_by_user = live
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'size': len(self._cache),
+                'maxsize': self._cache.maxsize,
+                'ttl_seconds': self._cache.ttl,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+session_cache = SessionCache(maxsize=SESSION_CACHE_MAXSIZE, ttl=SESSION_CACHE_TTL)
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'headers', 'tags', 'expires_at')
+
+    def __init__(self, body: bytes, headers: dict, tags: tuple, expires_at: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.headers = headers
+        self.tags = tags
+        self.expires_at = expires_at
+
+    def to_response(self, request: Request) -> Response:
+        headers = {'ETag': self.etag, **self.headers}
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and (if_none_match.strip() == '*' or self.etag in [t.strip() for t in if_none_match.split(',')]):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type='application/json', headers=headers)
+
+class ResponseCache:
+    """Byte-bounded LRU of serialized JSON bodies for public read endpoints.
+
+    Entries are tagged so write paths can drop exactly the responses they
+    affect; the TTL bounds staleness across worker processes.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, content, tags: tuple = (), headers: Optional[dict] = None) -> CachedResponse:
+        """Cache content, which is either an already-encoded JSON body or anything jsonable_encoder takes"""
+        if isinstance(content, bytes):
+            body = content
+        else:
+            body = json.dumps(
+                jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(',', ':')
+            ).encode('utf-8')
+        entry = CachedResponse(body, headers or {}, tags, time.monotonic() + self.ttl)
+        if len(body) > self.max_bytes:
+            return entry
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, set()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+response_cache = ResponseCache(max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL)
+
+def response_cache_key(request: Request) -> str:
+    # Re-encoded, so a value containing & or = cannot pass for a different parameter set
+    return request.url.path + '?' + urllib.parse.urlencode(sorted(request.query_params.multi_items()))
+
+def invalidate_coupon_responses(coupon_id: Optional[str] = None):
+    """Drop cached listing pages, and the detail page of coupon_id if given"""
+    tags = ['coupon_list']
+    if coupon_id:
+        tags.append(f"coupon:{coupon_id}")
+    response_cache.invalidate(*tags)
+
 async def get_current_user(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)) -> User:
     token = None
     if session_token:
@@ -156,6 +754,10 @@ async def get_current_user(authorization: Optional[str] = Header(None), session_
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    cached_user = session_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    
     session_doc = await db.user_sessions.find_one({'session_token': token}, {'_id': 0})
     if not session_doc:
         raise HTTPException(status_code=401, detail="Invalid session")
@@ -169,11 +771,615 @@ async def get_current_user(authorization: Optional[str] = Header(None), session_
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
+    generation = session_cache.generation(session_doc['user_id'])
     user_doc = await db.users.find_one({'user_id': session_doc['user_id']}, {'_id': 0})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.put(token, user, expires_at, generation)
+    return user
+
+async def require_metrics_access(authorization: Optional[str], session_token: Optional[str]):
+    """Metrics are for the scraper (METRICS_TOKEN) and admins only"""
+    if METRICS_TOKEN and authorization and hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}"):
+        return
+    user = await get_current_user(authorization, session_token)
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram in seconds, Prometheus style"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        self.bucket_counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+
+    def cumulative(self) -> list:
+        """[(upper bound, observations <= bound)], ending with +Inf"""
+        running = 0
+        result = []
+        for bound, n in zip([*self.BUCKETS, float('inf')], self.bucket_counts):
+            running += n
+            result.append((bound, running))
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound containing the q-th observation"""
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, running in self.cumulative():
+            if running >= target:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum_seconds': self.sum,
+            'errors': self.errors,
+            'p50_le': self.quantile(0.50),
+            'p95_le': self.quantile(0.95),
+            'p99_le': self.quantile(0.99),
+            'buckets': {('+Inf' if bound == float('inf') else str(bound)): n for bound, n in self.cumulative()}
+        }
+
+outbound_latency = {name: LatencyHistogram() for name in ('auth', 'stripe', 'llm')}
+
+@contextmanager
+def time_outbound(dependency: str):
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        outbound_latency[dependency].observe(elapsed, error=failed)
+        metrics = current_request_metrics.get()
+        if metrics is not None:
+            metrics.record_outbound(dependency, elapsed)
+
+class OutboundClients:
+    """App-lifetime clients for third-party services, opened at startup and closed at shutdown"""
+    MAX_STRIPE_CLIENTS = 8
+
+    def __init__(self, stripe_factory=StripeCheckout):
+        self._http = None
+        self._stripe = {}
+        self.stripe_factory = stripe_factory
+
+    def open(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        # transport lets benchmarks and tests route outbound HTTP to local stand-ins
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                transport=transport
+            )
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        self.open()
+        return self._http
+
+    def stripe(self, webhook_url: str) -> StripeCheckout:
+        # webhook_url is derived from the request host, so only a handful are kept
+        stripe_checkout = self._stripe.get(webhook_url)
+        if stripe_checkout is None:
+            stripe_checkout = self.stripe_factory(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+            if len(self._stripe) < self.MAX_STRIPE_CLIENTS:
+                self._stripe[webhook_url] = stripe_checkout
+        return stripe_checkout
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self._stripe.clear()
+
+outbound = OutboundClients()
+
+class PeriodicTask:
+    """Runs an async job every interval seconds until stopped; errors are logged, not fatal"""
+
+    def __init__(self, name: str, interval: float, job):
+        self.name = name
+        self.interval = interval
+        self.job = job
+        self._task = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Periodic task {self.name} failed: {e}")
+
+COUPON_STATUSES = ['pending', 'approved', 'rejected', 'sold', 'expired']
+
+def analytics_day(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d')
+
+async def record_analytics(counters: dict, daily: Optional[dict] = None, day: Optional[datetime] = None):
+    """Apply $inc deltas to the global rollup and, if given, to the day's bucket"""
+    writes = []
+    if counters:
+        writes.append(db.analytics_counters.update_one({'_id': 'global'}, {'$inc': counters}, upsert=True))
+    if daily:
+        day_key = analytics_day(day or datetime.now(timezone.utc))
+        writes.append(db.analytics_daily.update_one({'_id': day_key}, {'$inc': daily}, upsert=True))
+    if writes:
+        await asyncio.gather(*writes)
+
+async def record_coupon_status_change(old_status: Optional[str], new_status: str):
+    if old_status != new_status:
+        await record_analytics({f"coupons_{old_status}": -1, f"coupons_{new_status}": 1})
+
+async def insert_validation_log(coupon_id: str, validation_result: dict):
+    await db.ai_validation_logs.insert_one(validation_log_doc(coupon_id, validation_result))
+    if validation_result['risk_score'] == 'high':
+        await record_analytics({'fraud_attempts': 1}, {'fraud_attempts': 1})
+
+async def compute_analytics() -> tuple:
+    """Recount every rollup from the source collections (the slow path the rollups replace)"""
+    by_status, sales, disputes, users, fraud, daily_sales, daily_fraud = await asyncio.gather(
+        db.coupons.aggregate([{'$group': {'_id': '$status', 'n': {'$sum': 1}}}]).to_list(None),
+        db.transactions.aggregate([{'$group': {'_id': None, 'n': {'$sum': 1}, 'total': {'$sum': '$amount'}}}]).to_list(1),
+        db.disputes.count_documents({'status': 'open'}),
+        db.users.count_documents({}),
+        db.ai_validation_logs.count_documents({'risk_score': 'high'}),
+        db.transactions.aggregate([
+            {'$group': {
+                '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                'sales_count': {'$sum': 1},
+                'sales_amount': {'$sum': '$amount'}
+            }}
+        ]).to_list(None),
+        db.ai_validation_logs.aggregate([
+            {'$match': {'risk_score': 'high'}},
+            {'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}, 'fraud_attempts': {'$sum': 1}}}
+        ]).to_list(None)
+    )
+    
+    status_counts = {row['_id']: row['n'] for row in by_status}
+    counters = {
+        'total_users': users,
+        'total_coupons': sum(status_counts.values()),
+        **{f"coupons_{status}": status_counts.get(status, 0) for status in COUPON_STATUSES},
+        'total_transactions': sales[0]['n'] if sales else 0,
+        'total_sales': sales[0]['total'] if sales else 0,
+        'fraud_attempts': fraud,
+        'open_disputes': disputes
+    }
+    
+    daily = {}
+    for row in daily_sales:
+        daily.setdefault(row['_id'], {'sales_count': 0, 'sales_amount': 0, 'fraud_attempts': 0}).update(
+            sales_count=row['sales_count'], sales_amount=row['sales_amount']
+        )
+    for row in daily_fraud:
+        daily.setdefault(row['_id'], {'sales_count': 0, 'sales_amount': 0, 'fraud_attempts': 0})['fraud_attempts'] = row['fraud_attempts']
+    daily.pop(None, None)
+    return counters, daily
+
+DAILY_ROLLUP_FIELDS = ('sales_count', 'sales_amount', 'fraud_attempts')
+
+async def reconcile_analytics(apply: bool = True, report: bool = True) -> dict:
+    """Recount the rollups from scratch and report how far the stored ones had drifted.
+
+    Corrections are applied as $inc deltas rather than replacements, so
+    increments that land while the recount runs are not overwritten.
+    """
+    # Stored values are read first, so an $inc landing during the recount survives the correction
+    stored = await db.analytics_counters.find_one({'_id': 'global'}) or {}
+    stored_daily = {doc['_id']: doc for doc in await db.analytics_daily.find({}).to_list(None)}
+    counters, daily = await compute_analytics()
+    
+    counter_deltas = {
+        field: value - stored.get(field, 0)
+        for field, value in counters.items()
+        if abs(stored.get(field, 0) - value) > 1e-6
+    }
+    daily_deltas = {}
+    for day in set(daily) | set(stored_daily):
+        actual, have = daily.get(day, {}), stored_daily.get(day, {})
+        delta = {k: actual.get(k, 0) - have.get(k, 0) for k in DAILY_ROLLUP_FIELDS if abs(actual.get(k, 0) - have.get(k, 0)) > 1e-6}
+        if delta:
+            daily_deltas[day] = delta
+    drift = {field: {'stored': stored.get(field, 0), 'actual': counters[field]} for field in counter_deltas}
+    daily_drift = sorted(daily_deltas)
+    
+    if apply:
+        update = {'$set': {'rebuilt_at': datetime.now(timezone.utc)}}
+        if counter_deltas:
+            update['$inc'] = counter_deltas
+        await db.analytics_counters.update_one({'_id': 'global'}, update, upsert=True)
+        if daily_deltas:
+            await db.analytics_daily.bulk_write(
+                [UpdateOne({'_id': day}, {'$inc': delta}, upsert=True) for day, delta in daily_deltas.items()],
+                ordered=False
+            )
+    
+    if report and (drift or daily_drift):
+        logger.warning(f"Analytics rollup drift: {drift}, days: {daily_drift}")
+    return {'drift': drift, 'daily_drift': daily_drift, 'applied': apply}
+
+async def ensure_analytics_rollups():
+    if not await db.analytics_counters.find_one({'_id': 'global'}, {'_id': 1}):
+        await reconcile_analytics(report=False)
+        logger.info("Built analytics rollups from scratch")
+
+def rating_key(kind: str, key_id: str) -> str:
+    return f"{kind}:{key_id}"
+
+async def record_review_rating(seller_id: str, coupon_id: str, rating: int):
+    """Fold one review into the seller and coupon rating aggregates with atomic $inc"""
+    inc = {'count': 1, 'sum': rating, f"histogram.{rating}": 1}
+    await asyncio.gather(
+        db.rating_aggregates.update_one({'_id': rating_key('seller', seller_id)}, {'$inc': inc}, upsert=True),
+        db.rating_aggregates.update_one({'_id': rating_key('coupon', coupon_id)}, {'$inc': inc}, upsert=True)
+    )
+
+async def attach_ratings(coupons: List[dict]):
+    """Fill rating fields on a page of coupon docs with one batched aggregate lookup"""
+    keys = {rating_key('seller', c['seller_id']) for c in coupons} | {rating_key('coupon', c['coupon_id']) for c in coupons}
+    if not keys:
+        return
+    aggregates = {
+        doc['_id']: doc
+        for doc in await db.rating_aggregates.find({'_id': {'$in': list(keys)}}, {'count': 1, 'sum': 1}).to_list(len(keys))
+    }
+    for coupon in coupons:
+        for prefix, kind, key_id in (('', 'coupon', coupon['coupon_id']), ('seller_', 'seller', coupon['seller_id'])):
+            aggregate = aggregates.get(rating_key(kind, key_id))
+            if aggregate and aggregate.get('count'):
+                coupon[f"{prefix}rating"] = round(aggregate['sum'] / aggregate['count'], 2)
+                coupon[f"{prefix}review_count"] = aggregate['count']
+
+async def compute_rating_aggregates() -> dict:
+    """Seller and coupon rating aggregates recounted from the reviews collection, by aggregate key"""
+    histogram = {f"histogram.{n}": {'$sum': {'$cond': [{'$eq': ['$rating', n]}, 1, 0]}} for n in range(1, 6)}
+    aggregates = {}
+    for kind, field in (('seller', '$seller_id'), ('coupon', '$coupon_id')):
+        rows = await db.reviews.aggregate([
+            {'$group': {'_id': field, 'count': {'$sum': 1}, 'sum': {'$sum': '$rating'}, **{k.replace('.', '_'): v for k, v in histogram.items()}}}
+        ]).to_list(None)
+        for row in rows:
+            aggregates[rating_key(kind, row['_id'])] = {
+                'count': row['count'],
+                'sum': row['sum'],
+                'histogram': {str(n): row[f"histogram_{n}"] for n in range(1, 6)}
+            }
+    return aggregates
+
+async def rebuild_rating_aggregates() -> dict:
+    """Recompute every seller and coupon rating aggregate from the reviews collection"""
+    rebuilt = await compute_rating_aggregates()
+    await db.rating_aggregates.delete_many({'_id': {'$nin': list(rebuilt)}})
+    if rebuilt:
+        await db.rating_aggregates.bulk_write(
+            [ReplaceOne({'_id': key}, values, upsert=True) for key, values in rebuilt.items()],
+            ordered=False
+        )
+    invalidate_coupon_responses()
+    return {'aggregates': len(rebuilt)}
+
+def rating_fields(aggregate: dict) -> dict:
+    return {
+        'count': aggregate.get('count', 0),
+        'sum': aggregate.get('sum', 0),
+        **{f"histogram.{n}": aggregate.get('histogram', {}).get(str(n), 0) for n in range(1, 6)}
+    }
+
+async def reconcile_rating_aggregates() -> dict:
+    """Correct rating aggregates that drifted from the reviews, e.g. a review whose $inc was lost to a crash.
+
+    Corrections are $inc deltas rather than replacements, so reviews
+    recorded while the recount runs are not overwritten.
+    """
+    # Stored values are read first, so an $inc landing during the recount survives the correction
+    stored = {doc['_id']: doc async for doc in db.rating_aggregates.find({})}
+    actual = await compute_rating_aggregates()
+    
+    corrections = {}
+    for key in set(actual) | set(stored):
+        have, want = rating_fields(stored.get(key, {})), rating_fields(actual.get(key, {}))
+        delta = {field: want[field] - have[field] for field in want if want[field] != have[field]}
+        if delta:
+            corrections[key] = delta
+    
+    if corrections:
+        await db.rating_aggregates.bulk_write(
+            [UpdateOne({'_id': key}, {'$inc': delta}, upsert=True) for key, delta in corrections.items()],
+            ordered=False
+        )
+        invalidate_coupon_responses()
+        logger.warning(f"Rating aggregate drift corrected on {len(corrections)} aggregates: {sorted(corrections)[:20]}")
+    return {'corrected': len(corrections)}
+
+rating_reconciler = PeriodicTask('rating-reconcile', RATING_RECONCILE_INTERVAL, reconcile_rating_aggregates)
+
+analytics_reconciler = PeriodicTask('analytics-reconcile', ANALYTICS_RECONCILE_INTERVAL, reconcile_analytics)
+
+def ledger_entry_doc(user_id: str, kind: str, amount: float, ref_id: str, now: Optional[datetime] = None, state: str = 'done') -> dict:
+    return {
+        'entry_id': f"led_{uuid.uuid4().hex[:12]}",
+        'user_id': user_id,
+        'kind': kind,
+        'amount': round(amount, 2),
+        'ref_id': ref_id,
+        'state': state,
+        'created_at': now or datetime.now(timezone.utc)
+    }
+
+async def claim_ledger_credits(entries: List[dict]) -> List[dict]:
+    """Move each entry to applied under a fresh applied_at; returns the entries this caller won.
+
+    A pending entry is claimed once. An applied one (left by a crash) is
+    re-claimed only if applied_at still holds the value the caller read,
+    so of a request and a recovery sweep racing for the same entry exactly
+    one goes on to credit it.
+    """
+    now = datetime.now(timezone.utc)
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # BSON dates keep milliseconds; later steps match on it
+    
+    async def claim(entry: dict) -> Optional[dict]:
+        query = {'entry_id': entry['entry_id'], 'state': entry['state']}
+        if entry['state'] == 'applied':
+            query['applied_at'] = entry['applied_at']
+        result = await db.wallet_ledger.update_one(query, {'$set': {'state': 'applied', 'applied_at': now}})
+        return {**entry, 'state': 'applied', 'applied_at': now} if result.modified_count else None
+    
+    return [entry for entry in await asyncio.gather(*(claim(entry) for entry in entries)) if entry]
+
+async def apply_ledger_credits(entries: List[dict]):
+    """Fold pending (or stale applied) credit entries into balances; every step is conditional, so re-running it is safe.
+
+    Only entries this caller claims are credited. The $inc also only
+    matches a user row that does not yet list the entry id in
+    pending_credits and pushes the id in the same update, so finishing a
+    claim that had already credited before a crash does not credit twice.
+    """
+    claimed = await claim_ledger_credits(entries)
+    if not claimed:
+        return
+    await db.users.bulk_write(
+        [
+            UpdateOne(
+                {'user_id': entry['user_id'], 'pending_credits': {'$ne': entry['entry_id']}},
+                {'$inc': {'wallet_balance': entry['amount']}, '$push': {'pending_credits': entry['entry_id']}}
+            )
+            for entry in claimed
+        ],
+        ordered=False
+    )
+    await finish_ledger_credits(claimed)
+
+async def finish_ledger_credits(entries: List[dict]):
+    """Mark claimed entries done, then unpark their ids from the user rows.
+
+    Done comes first, so an applied entry whose id is not on the user row
+    was never credited. A claim taken over by recovery is left to finish
+    there; an id left parked by a crash between the two steps is harmless.
+    """
+    async def finish(entry: dict) -> bool:
+        result = await db.wallet_ledger.update_one(
+            {'entry_id': entry['entry_id'], 'state': 'applied', 'applied_at': entry['applied_at']},
+            {'$set': {'state': 'done'}}
+        )
+        return bool(result.modified_count)
+    
+    finished = await asyncio.gather(*(finish(entry) for entry in entries))
+    entry_ids_by_user = {}
+    for entry, done in zip(entries, finished):
+        if done:
+            entry_ids_by_user.setdefault(entry['user_id'], []).append(entry['entry_id'])
+    if not entry_ids_by_user:
+        return
+    await db.users.bulk_write(
+        [UpdateOne({'user_id': user_id}, {'$pullAll': {'pending_credits': entry_ids}}) for user_id, entry_ids in entry_ids_by_user.items()],
+        ordered=False
+    )
+    for user_id in entry_ids_by_user:
+        session_cache.invalidate_user(user_id)
+
+async def credit_wallets(credits: List[tuple]) -> int:
+    """Append (user_id, amount, kind, ref_id) credits to the ledger and fold them into balances.
+
+    (kind, ref_id) is unique in the ledger, so a credit that was already
+    recorded is skipped rather than applied twice. Entries are written
+    pending first; if the process dies before they are applied,
+    recover_wallet_credits finishes them. Returns how many credits were new.
+    """
+    now = datetime.now(timezone.utc)
+    docs = [ledger_entry_doc(user_id, kind, amount, ref_id, now, state='pending') for user_id, amount, kind, ref_id in credits]
+    if not docs:
+        return 0
+    
+    failed, error = set(), None
+    try:
+        await db.wallet_ledger.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get('writeErrors', [])
+        failed = {err['index'] for err in write_errors}
+        if any(err.get('code') != 11000 for err in write_errors):
+            error = e
+    
+    await apply_ledger_credits([doc for index, doc in enumerate(docs) if index not in failed])
+    if error is not None:
+        raise error
+    return len(docs) - len(failed)
+
+async def credit_wallet(user_id: str, amount: float, kind: str, ref_id: str) -> bool:
+    return await credit_wallets([(user_id, amount, kind, ref_id)]) == 1
+
+async def debit_wallet(user_id: str, amount: float, kind: str, ref_id: str) -> Optional[float]:
+    """Take amount from the balance only if it covers it, in one conditional update; returns the new balance or None"""
+    amount = round(amount, 2)
+    previous = await db.users.find_one_and_update(
+        {'user_id': user_id, 'wallet_balance': {'$gte': amount}},
+        {'$inc': {'wallet_balance': -amount}},
+        projection={'_id': 0, 'wallet_balance': 1}
+    )
+    if previous is None:
+        return None
+    session_cache.invalidate_user(user_id)
+    try:
+        await db.wallet_ledger.insert_one(ledger_entry_doc(user_id, kind, -amount, ref_id))
+    except Exception:
+        await db.users.update_one({'user_id': user_id}, {'$inc': {'wallet_balance': amount}})
+        session_cache.invalidate_user(user_id)
+        raise
+    return round(previous['wallet_balance'] - amount, 2)
+
+async def settle_withdrawals(withdrawal_ids: List[str], status: str, admin_id: str) -> dict:
+    """Move pending withdrawals to paid or rejected in one update_many; rejected ones are refunded in bulk.
+
+    Each call stamps its own settlement_id, so withdrawals another settlement
+    already took are neither counted nor refunded twice.
+    """
+    settlement_id = f"stl_{uuid.uuid4().hex[:12]}"
+    update = {'status': status, 'settlement_id': settlement_id, 'settled_by': admin_id, 'settled_at': datetime.now(timezone.utc)}
+    if status == 'rejected':
+        update['refund_pending'] = True
+    result = await db.withdrawals.update_many(
+        {'withdrawal_id': {'$in': withdrawal_ids}, 'status': 'pending'},
+        {'$set': update}
+    )
+    
+    refunded = 0
+    if status == 'rejected' and result.modified_count:
+        settled = await db.withdrawals.find(
+            {'settlement_id': settlement_id},
+            {'_id': 0, 'withdrawal_id': 1, 'user_id': 1, 'amount': 1}
+        ).to_list(None)
+        refunded = await refund_withdrawals(settled)
+    
+    return {'settlement_id': settlement_id, 'settled': result.modified_count, 'refunded': refunded}
+
+async def refund_withdrawals(withdrawals: List[dict]) -> int:
+    refunded = await credit_wallets([(w['user_id'], w['amount'], 'withdrawal_reversal', w['withdrawal_id']) for w in withdrawals])
+    await db.withdrawals.update_many(
+        {'withdrawal_id': {'$in': [w['withdrawal_id'] for w in withdrawals]}},
+        {'$unset': {'refund_pending': ''}}
+    )
+    return refunded
+
+async def pay_out_sales(transactions: List[dict]) -> int:
+    paid = await credit_wallets([
+        (t['seller_id'], t['amount'] - t['platform_commission'], 'sale', t['transaction_id']) for t in transactions
+    ])
+    await db.transactions.update_many(
+        {'transaction_id': {'$in': [t['transaction_id'] for t in transactions]}},
+        {'$unset': {'payout_pending': ''}}
+    )
+    return paid
+
+async def recover_wallet_credits(batch_size: int = 1000) -> dict:
+    """Finish credits a crashed request left behind; everything older than the grace period is retried.
+
+    Covers sales and rejected withdrawals whose credit was never written,
+    ledger credits written but not applied, and claims that were never
+    finished.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=WALLET_RECOVERY_GRACE)
+    sales = await db.transactions.find(
+        {'payout_pending': True, 'completed_at': {'$lt': cutoff}},
+        {'_id': 0, 'transaction_id': 1, 'seller_id': 1, 'amount': 1, 'platform_commission': 1}
+    ).limit(batch_size).to_list(batch_size)
+    if sales:
+        await pay_out_sales(sales)
+    refunds = await db.withdrawals.find(
+        {'refund_pending': True, 'settled_at': {'$lt': cutoff}},
+        {'_id': 0, 'withdrawal_id': 1, 'user_id': 1, 'amount': 1}
+    ).limit(batch_size).to_list(batch_size)
+    if refunds:
+        await refund_withdrawals(refunds)
+    
+    entry_fields = {'_id': 0, 'entry_id': 1, 'user_id': 1, 'amount': 1, 'state': 1, 'applied_at': 1}
+    pending = await db.wallet_ledger.find({'state': 'pending', 'created_at': {'$lt': cutoff}}, entry_fields).limit(batch_size).to_list(batch_size)
+    applied = await db.wallet_ledger.find({'state': 'applied', 'applied_at': {'$lt': cutoff}}, entry_fields).limit(batch_size).to_list(batch_size)
+    await apply_ledger_credits(pending + applied)
+    
+    recovered = {'sales': len(sales), 'refunds': len(refunds), 'pending': len(pending), 'applied': len(applied)}
+    if any(recovered.values()):
+        logger.warning(f"Recovered interrupted wallet credits: {recovered}")
+    return recovered
+
+wallet_recovery = PeriodicTask('wallet-recovery', WALLET_RECOVERY_INTERVAL, recover_wallet_credits)
+
+async def wallet_drift(limit: int = 100) -> List[dict]:
+    """Users whose materialized balance differs from the sum of their applied ledger entries"""
+    sums = await db.wallet_ledger.aggregate([
+        {'$match': {'state': {'$ne': 'pending'}}},
+        {'$group': {'_id': '$user_id', 'ledger_balance': {'$sum': '$amount'}}}
+    ]).to_list(None)
+    ledger = {row['_id']: round(row['ledger_balance'], 2) for row in sums}
+    
+    drift = []
+    async for user in db.users.find({}, {'_id': 0, 'user_id': 1, 'wallet_balance': 1}):
+        balance = round(user.get('wallet_balance', 0.0), 2)
+        expected = ledger.get(user['user_id'], 0.0)
+        if balance != expected:
+            drift.append({'user_id': user['user_id'], 'wallet_balance': balance, 'ledger_balance': expected})
+            if len(drift) >= limit:
+                break
+    return drift
+
+async def ensure_wallet_ledger(batch_size: int = 1000):
+    """Open the ledger with each user's current balance the first time it is used"""
+    if await db.wallet_ledger.find_one({}, {'_id': 1}):
+        return
+    total = 0
+    cursor = db.users.find({'wallet_balance': {'$ne': 0}}, {'_id': 0, 'user_id': 1, 'wallet_balance': 1}).batch_size(batch_size)
+    batch = []
+    async for user in cursor:
+        batch.append(ledger_entry_doc(user['user_id'], 'opening_balance', user['wallet_balance'], user['user_id']))
+        if len(batch) >= batch_size:
+            total += await insert_opening_entries(batch)
+            batch = []
+    if batch:
+        total += await insert_opening_entries(batch)
+    if total:
+        logger.info(f"Opened wallet ledger for {total} users")
+
+async def insert_opening_entries(docs: List[dict]) -> int:
+    try:
+        await db.wallet_ledger.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        return len(docs) - len(e.details.get('writeErrors', []))
+    return len(docs)
 
 @api_router.get("/")
 async def root():
@@ -181,95 +1387,89 @@ async def root():
 
 @api_router.post("/auth/session")
 async def create_session(request: SessionDataRequest, response: Response):
-    \"\"\"Exchange Emergent session_id for user data and create session\"\"\"
+    """Exchange Emergent session_id for user data and create session"""
     try:
-        async with httpx.AsyncClient() as http_client:
-            resp = await http_client.get(
-                'https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data',
+        with time_outbound('auth'):
+            resp = await outbound.http.get(
+                AUTH_SESSION_DATA_URL,
                 headers={'X-Session-ID': request.session_id}
             )
-            
-            if resp.status_code != 200:
-                raise HTTPException(status_code=401, detail="Invalid session")
-            
-            data = resp.json()
-            
-            user_id = f"user_{uuid.uuid4().hex[:12]}"
-            existing_user = await db.users.find_one({'email': data['email']}, {'_id': 0})
-            
-            if existing_user:
-                user_id = existing_user['user_id']
-                await db.users.update_one(
-                    {'user_id': user_id},
-                    {'$set': {'name': data['name'], 'picture': data.get('picture')}}
-                )
-            else:
-                user_doc = {
-                    'user_id': user_id,
-                    'email': data['email'],
-                    'name': data['name'],
-                    'picture': data.get('picture'),
-                    'role': 'buyer',
-                    'wallet_balance': 0.0,
-                    'created_at': datetime.now(timezone.utc)
-                }
-                await db.users.insert_one(user_doc)
-            
-            session_token = data.get('session_token', f"session_{uuid.uuid4().hex}")
-            expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-            
-            await db.user_sessions.delete_many({'user_id': user_id})
-            
-            session_doc = {
+        
+        if resp.status_code != 200:
+            raise HTTPException(status_code=401, detail="Invalid session")
+        
+        data = resp.json()
+        
+        user_id = f"user_{uuid.uuid4().hex[:12]}"
+        existing_user = await db.users.find_one({'email': data['email']}, {'_id': 0})
+        
+        if existing_user:
+            user_id = existing_user['user_id']
+            await db.users.update_one(
+                {'user_id': user_id},
+                {'$set': {'name': data['name'], 'picture': data.get('picture')}}
+            )
+        else:
+            user_doc = {
                 'user_id': user_id,
-                'session_token': session_token,
-                'expires_at': expires_at,
+                'email': data['email'],
+                'name': data['name'],
+                'picture': data.get('picture'),
+                'role': 'buyer',
+                'wallet_balance': 0.0,
                 'created_at': datetime.now(timezone.utc)
             }
-            await db.user_sessions.insert_one(session_doc)
-            
-            response.set_cookie(
-                key='session_token',
-                value=session_token,
-                httponly=True,
-                secure=True,
-                samesite='none',
-                path='/',
-                max_age=7*24*60*60
-            )
-            
-            user = await db.users.find_one({'user_id': user_id}, {'_id': 0})
-            return user
-            
+            await db.users.insert_one(user_doc)
+            await record_analytics({'total_users': 1})
+        
+        session_token = data.get('session_token', f"session_{uuid.uuid4().hex}")
+        expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+        
+        await db.user_sessions.delete_many({'user_id': user_id})
+        session_cache.invalidate_user(user_id)
+        
+        session_doc = {
+            'user_id': user_id,
+            'session_token': session_token,
+            'expires_at': expires_at,
+            'created_at': datetime.now(timezone.utc)
+        }
+        await db.user_sessions.insert_one(session_doc)
+        
+        response.set_cookie(
+            key='session_token',
+            value=session_token,
+            httponly=True,
+            secure=True,
+            samesite='none',
+            path='/',
+            max_age=7*24*60*60
+        )
+        
+        user = await db.users.find_one({'user_id': user_id}, {'_id': 0})
+        return user
+    
     except httpx.HTTPError as e:
         logger.error(f"Error fetching session data: {e}")
         raise HTTPException(status_code=500, detail="Authentication service error")
 
 @api_router.get("/auth/me")
 async def get_me(request: Request, session_token: Optional[str] = Cookie(None), authorization: Optional[str] = Header(None)):
-    \"\"\"Get current authenticated user\"\"\"
+    """Get current authenticated user"""
     user = await get_current_user(authorization, session_token)
     return user
 
 @api_router.post("/auth/logout")
 async def logout(response: Response, session_token: Optional[str] = Cookie(None)):
-    \"\"\"Logout user and clear session\"\"\"
+    """Logout user and clear session"""
     if session_token:
         await db.user_sessions.delete_one({'session_token': session_token})
+        session_cache.invalidate_token(session_token)
     
     response.delete_cookie(key='session_token', path='/', samesite='none', secure=True)
     return {"message": "Logged out successfully"}
 
-@api_router.post("/coupons/validate")
-async def validate_coupon(coupon: CouponCreate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
-    \"\"\"AI validation of coupon before submission\"\"\"
-    user = await get_current_user(authorization, session_token)
-    
-    try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"validation_{uuid.uuid4().hex[:8]}",
-            system_message=\"\"\"You are an AI coupon validator. Analyze the coupon details and determine:
+VALIDATOR_SYSTEM_MESSAGE = """You are an AI coupon validator. Analyze the coupon details and determine:
 1. Is the expiry date valid and in the future?
 2. Does the coupon code format look legitimate?
 3. Is there potential for fraud or suspicious patterns?
@@ -277,105 +1477,936 @@ async def validate_coupon(coupon: CouponCreate, authorization: Optional[str] = H
 
 Respond ONLY with JSON in this format:
 {
-  \"risk_score\": \"low\" | \"medium\" | \"high\",
-  \"feedback\": \"Brief explanation of your assessment\",
-  \"issues\": [\"list of specific issues found\"],
-  \"recommendation\": \"approve\" | \"review\" | \"reject\"
-}\"\"\"
-        ).with_model('openai', 'gpt-5.2')
+  "risk_score": "low" | "medium" | "high",
+  "feedback": "Brief explanation of your assessment",
+  "issues": ["list of specific issues found"],
+  "recommendation": "approve" | "review" | "reject"
+}"""
+
+FALLBACK_VALIDATION = {
+    'risk_score': 'medium',
+    'feedback': 'Unable to complete AI validation. Manual review recommended.',
+    'issues': ['AI validation service temporarily unavailable'],
+    'recommendation': 'review'
+}
+
+class FakeLlmChat:
+    """Local stand-in for LlmChat (LLM_PROVIDER=fake) for development and tests"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def send_message(self, message: UserMessage) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        fields = dict(line.split(': ', 1) for line in message.text.splitlines() if ': ' in line)
+        value = float(fields.get('Value', '$0').lstrip('$'))
+        price = float(fields.get('Asking Price', '$0').lstrip('$'))
+        if price > value:
+            return json.dumps({'risk_score': 'high', 'feedback': 'Asking price exceeds coupon value',
+                               'issues': ['asking_price > coupon_value'], 'recommendation': 'reject'})
+        return json.dumps({'risk_score': 'low', 'feedback': 'Coupon looks legitimate',
+                           'issues': [], 'recommendation': 'approve'})
+
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+def build_validator_chat():
+    if LLM_PROVIDER == 'fake':
+        return FakeLlmChat(latency=FAKE_LLM_LATENCY_MS / 1000)
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=f"validation_{uuid.uuid4().hex[:8]}",
+        system_message=VALIDATOR_SYSTEM_MESSAGE
+    ).with_model('openai', 'gpt-5.2')
+
+class ComputationCancelled(Exception):
+    """Raised to coalesced waiters when the caller computing their shared result is cancelled"""
+
+class ValidationResultCache:
+    """Content-addressed memo of LLM verdicts: in-memory LRU in front of a Mongo TTL collection.
+
+    Concurrent lookups of the same key while the first is still computing
+    share its future, so identical validations cost one LLM call. Failures
+    are never cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(coupon: CouponCreate, flags: List[str]) -> str:
+        content = [
+            normalize_brand(coupon.brand_name),
+            normalize_coupon_code(coupon.coupon_code),
+            coupon.expiry_date.strip(),
+            round(coupon.coupon_value, 2),
+            round(coupon.asking_price, 2),
+            sorted(flags)
+        ]
+        return hashlib.sha256(json.dumps(content, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    async def get_or_compute(self, key: str, compute) -> dict:
+        result = self._memory.get(key)
+        if result is not None:
+            self.memory_hits += 1
+            return dict(result)
         
-        message = UserMessage(
-            text=f\"\"\"Validate this coupon:
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return dict(await asyncio.shield(pending))
+            except ComputationCancelled:
+                # The caller doing the work was cancelled; that is no reason to fail this one
+                return await self.get_or_compute(key, compute)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._load(key)
+            if result is not None:
+                self.store_hits += 1
+            else:
+                self.misses += 1
+                result = await compute()
+                await self._store(key, result)
+            self._memory[key] = result
+            future.set_result(result)
+            return dict(result)
+        except asyncio.CancelledError:
+            future.set_exception(ComputationCancelled(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _load(self, key: str) -> Optional[dict]:
+        doc = await db.llm_validation_cache.find_one({'_id': key})
+        if not doc:
+            return None
+        expires_at = doc['expires_at']
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return doc['result'] if expires_at > datetime.now(timezone.utc) else None
+
+    async def _store(self, key: str, result: dict):
+        now = datetime.now(timezone.utc)
+        await db.llm_validation_cache.replace_one(
+            {'_id': key},
+            {'result': result, 'created_at': now, 'expires_at': now + timedelta(seconds=self.ttl)},
+            upsert=True
+        )
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.store_hits + self.coalesced + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'store_hits': self.store_hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+            'memory_size': len(self._memory),
+            'hit_rate': (lookups - self.misses) / lookups if lookups else 0.0
+        }
+
+validation_result_cache = ValidationResultCache(maxsize=VALIDATION_CACHE_MAXSIZE, ttl=VALIDATION_CACHE_TTL)
+
+async def run_ai_validation(coupon: CouponCreate, flags: Optional[List[str]] = None) -> dict:
+    """Verdict for a coupon, answered from the result cache when the same content was seen before"""
+    flags = flags or []
+    return await validation_result_cache.get_or_compute(
+        ValidationResultCache.key_for(coupon, flags),
+        lambda: call_validator_llm(coupon, flags)
+    )
+
+async def call_validator_llm(coupon: CouponCreate, flags: List[str]) -> dict:
+    """Ask the LLM for a verdict on a coupon; raises if the call or its JSON fails.
+
+    flags are pre-screen signals that did not warrant a rejection on their
+    own; they are shown to the model and carried into the reported issues.
+    """
+    text = f"""Validate this coupon:
 Brand: {coupon.brand_name}
 Code: {coupon.coupon_code}
 Expiry: {coupon.expiry_date}
 Value: ${coupon.coupon_value}
 Asking Price: ${coupon.asking_price}
-\"\"\"
-        )
-        
-        response = await chat.send_message(message)
+"""
+    if flags:
+        text += f"Signals: {'; '.join(flags)}\n"
+    message = UserMessage(text=text)
+    
+    async with llm_semaphore:
+        with time_outbound('llm'):
+            response = await build_validator_chat().send_message(message)
+    
+    validation_result = json.loads(response)
+    
+    return {
+        'risk_score': validation_result.get('risk_score', 'medium'),
+        'feedback': validation_result.get('feedback', 'Validation completed'),
+        'issues': flags + validation_result.get('issues', []),
+        'recommendation': validation_result.get('recommendation', 'review'),
+        'source': 'llm'
+    }
+
+def coupon_status_for(validation_result: dict) -> str:
+    if validation_result['risk_score'] == 'low' and validation_result['recommendation'] == 'approve':
+        return 'approved'
+    if validation_result['risk_score'] == 'high' or validation_result['recommendation'] == 'reject':
+        return 'rejected'
+    return 'pending'
+
+EXPIRY_DATE_FORMATS = ('%Y/%m/%d', '%Y.%m.%d', '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y')
+# Numeric dates whose day/month order is ambiguous (03/04/2027); the earliest reading wins so a
+# coupon is never kept on sale past the date the seller may have meant
+NUMERIC_EXPIRY_DATE_FORMATS = ('%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y', '%d.%m.%Y', '%m/%d/%y', '%d/%m/%y')
+# Month-only expiries (12/2027, Dec 2027) run to the last day of that month
+EXPIRY_MONTH_FORMATS = ('%m/%Y', '%m-%Y', '%Y-%m', '%b %Y', '%B %Y')
+EXPIRY_DAY_ORDINAL = re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)\b', re.IGNORECASE)
+# Matched against the normalized code; common punctuation in real codes (dots, slashes, !) is fine
+COUPON_CODE_PATTERN = re.compile(r'^[A-Z0-9.!#&+/:@*]{4,64}$')
+COUPON_CODE_MAX_LENGTH = 64
+
+def _strptime(value: str, fmt: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, fmt)
+    except ValueError:
+        return None
+
+def parse_expiry_date(value: str) -> Optional[datetime]:
+    """Parse a seller-entered expiry string as UTC; None if the format is not recognised"""
+    value = EXPIRY_DAY_ORDINAL.sub(r'\1', value.strip())
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = next(filter(None, (_strptime(value, fmt) for fmt in EXPIRY_DATE_FORMATS)), None)
+        if parsed is None:
+            readings = [d for d in (_strptime(value, fmt) for fmt in NUMERIC_EXPIRY_DATE_FORMATS) if d]
+            parsed = min(readings) if readings else None
+        if parsed is None:
+            month = next(filter(None, (_strptime(value, fmt) for fmt in EXPIRY_MONTH_FORMATS)), None)
+            if month is None:
+                return None
+            parsed = month.replace(day=calendar.monthrange(month.year, month.month)[1])
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def coupon_expires_at(expiry_date: str) -> Optional[datetime]:
+    """The instant a coupon stops being valid; a bare date stays valid through that whole day"""
+    expiry = parse_expiry_date(expiry_date)
+    if expiry is not None and expiry.timetz().replace(tzinfo=None) == datetime.min.time():
+        expiry += timedelta(days=1)
+    return expiry
+
+async def sweep_expired_coupons(batch_size: int = COUPON_EXPIRY_SWEEP_BATCH_SIZE) -> int:
+    """Flip approved coupons past expires_at to expired, one update_many per batch"""
+    total = 0
+    while True:
+        now = datetime.now(timezone.utc)
+        batch = await db.coupons.find(
+            {'status': 'approved', 'expires_at': {'$lte': now}},
+            {'_id': 0, 'coupon_id': 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        coupon_ids = [c['coupon_id'] for c in batch]
+        result = await db.coupons.update_many(
+            {'coupon_id': {'$in': coupon_ids}, 'status': 'approved'},
+            {'$set': {'status': 'expired', 'updated_at': now}, '$unset': {'live_fingerprint': ''}}
+        )
+        if result.modified_count:
+            await record_analytics({'coupons_approved': -result.modified_count, 'coupons_expired': result.modified_count})
+        response_cache.invalidate('coupon_list', *(f"coupon:{coupon_id}" for coupon_id in coupon_ids))
+        total += result.modified_count
+        if len(batch) < batch_size:
+            break
+    if total:
+        logger.info(f"Expired {total} coupons")
+    return total
+
+coupon_expiry_sweeper = PeriodicTask('coupon-expiry', COUPON_EXPIRY_SWEEP_INTERVAL, sweep_expired_coupons)
+
+def rule_price_sanity(coupon: CouponCreate, coupon_id: Optional[str]) -> Optional[str]:
+    if coupon.coupon_value <= 0 or coupon.asking_price <= 0:
+        return "Coupon value and asking price must be positive"
+    if coupon.asking_price > coupon.coupon_value:
+        return "Asking price exceeds coupon value"
+    return None
+
+def rule_expiry_not_past(coupon: CouponCreate, coupon_id: Optional[str]) -> Optional[str]:
+    expiry = parse_expiry_date(coupon.expiry_date)
+    if expiry is not None and expiry.date() < datetime.now(timezone.utc).date():
+        return "Coupon has already expired"
+    return None
+
+def rule_code_format(coupon: CouponCreate, coupon_id: Optional[str]) -> Optional[str]:
+    """Only codes that cannot be real are rejected outright; odd-looking ones are flagged instead"""
+    normalized = normalize_coupon_code(coupon.coupon_code)
+    if not normalized or len(normalized) > COUPON_CODE_MAX_LENGTH or not normalized.isprintable():
+        return "Coupon code is malformed"
+    return None
+
+def rule_unusual_code_format(coupon: CouponCreate, coupon_id: Optional[str]) -> Optional[str]:
+    if not COUPON_CODE_PATTERN.match(normalize_coupon_code(coupon.coupon_code)):
+        return "Coupon code has an unusual length or characters"
+    return None
+
+async def rule_code_not_listed(coupon: CouponCreate, coupon_id: Optional[str]) -> Optional[str]:
+    fingerprint = code_fingerprint_fields(coupon.coupon_code)['code_fingerprint']
+    existing = await db.coupons.find_one(
+        {'code_fingerprint': fingerprint, 'status': {'$in': LIVE_COUPON_STATUSES}, 'coupon_id': {'$ne': coupon_id}},
+        {'_id': 0, 'coupon_id': 1}
+    )
+    if existing:
+        return "Coupon code is already listed"
+    return None
+
+async def rule_similar_code_listed(coupon: CouponCreate, coupon_id: Optional[str]) -> Optional[str]:
+    if len(normalize_coupon_code(coupon.coupon_code)) <= CODE_PREFIX_LENGTH:
+        return None
+    code_fields = code_fingerprint_fields(coupon.coupon_code)
+    similar = await db.coupons.find_one(
+        {
+            'brand_key': normalize_brand(coupon.brand_name),
+            'code_prefix': code_fields['code_prefix'],
+            'code_fingerprint': {'$ne': code_fields['code_fingerprint']},
+            'status': {'$in': LIVE_COUPON_STATUSES},
+            'coupon_id': {'$ne': coupon_id}
+        },
+        {'_id': 0, 'coupon_id': 1}
+    )
+    if similar:
+        return f"A code with the same prefix is already listed for this brand ({similar['coupon_id']})"
+    return None
+
+def rule_auto_approve(coupon: CouponCreate, coupon_id: Optional[str]) -> bool:
+    """Opt-in: low-value, sensibly priced coupons with a readable, distant expiry need no LLM opinion"""
+    if PRESCREEN_AUTO_APPROVE_MAX_VALUE <= 0:
+        return False
+    expiry = parse_expiry_date(coupon.expiry_date)
+    return (
+        coupon.coupon_value <= PRESCREEN_AUTO_APPROVE_MAX_VALUE
+        and coupon.asking_price <= coupon.coupon_value * 0.9
+        and expiry is not None
+        and expiry >= datetime.now(timezone.utc) + timedelta(days=7)
+    )
+
+def prescreen_reject_verdict(issue: str, rule_name: str) -> dict:
+    return {
+        'risk_score': 'high',
+        'feedback': f"Rejected by pre-screen: {issue}",
+        'issues': [issue],
+        'recommendation': 'reject',
+        'source': 'prescreen',
+        'rule': rule_name
+    }
+
+# What a listing gets when the unique live_fingerprint index catches a duplicate the pre-screen read raced past
+DUPLICATE_CODE_VERDICT = prescreen_reject_verdict("Coupon code is already listed", 'rule_code_not_listed')
+
+class CouponPrescreen:
+    """Deterministic checks run ahead of the LLM validator.
+
+    Reject rules run cheapest first and stop at the first that fires. Flag
+    rules collect suspicious-but-inconclusive signals; any flag rules out
+    auto-approval. Otherwise the auto-approve rule, which is off unless
+    PRESCREEN_AUTO_APPROVE_MAX_VALUE is set, may settle the coupon.
+    Anything unsettled is escalated to the LLM: evaluate returns
+    (None, flags) and the flags should be passed on to run_ai_validation.
+    """
+
+    def __init__(self, reject_rules: list, flag_rules: list, approve_rule):
+        self.reject_rules = reject_rules
+        self.flag_rules = flag_rules
+        self.approve_rule = approve_rule
+        self.rule_stats = {
+            rule.__name__: {'evaluated': 0, 'fired': 0, 'total_ms': 0.0}
+            for rule in [*reject_rules, *flag_rules, approve_rule]
+        }
+        self.rejected = 0
+        self.approved = 0
+        self.escalated = 0
+        self.flagged = 0
+
+    async def _run(self, rule, coupon: CouponCreate, coupon_id: Optional[str]):
+        started = time.perf_counter()
+        outcome = rule(coupon, coupon_id)
+        if inspect.isawaitable(outcome):
+            outcome = await outcome
+        stats = self.rule_stats[rule.__name__]
+        stats['evaluated'] += 1
+        stats['total_ms'] += (time.perf_counter() - started) * 1000
+        if outcome:
+            stats['fired'] += 1
+        return outcome
+
+    async def evaluate(self, coupon: CouponCreate, coupon_id: Optional[str] = None) -> tuple:
+        for rule in self.reject_rules:
+            issue = await self._run(rule, coupon, coupon_id)
+            if issue:
+                self.rejected += 1
+                return prescreen_reject_verdict(issue, rule.__name__), []
+        
+        flags = []
+        for rule in self.flag_rules:
+            flag = await self._run(rule, coupon, coupon_id)
+            if flag:
+                flags.append(flag)
+        if flags:
+            self.flagged += 1
         
-        import json
-        validation_result = json.loads(response)
+        if not flags and await self._run(self.approve_rule, coupon, coupon_id):
+            self.approved += 1
+            return {
+                'risk_score': 'low',
+                'feedback': 'Passed deterministic pre-screen checks',
+                'issues': [],
+                'recommendation': 'approve',
+                'source': 'prescreen',
+                'rule': self.approve_rule.__name__
+            }, []
         
+        self.escalated += 1
+        return None, flags
+
+    def stats(self) -> dict:
         return {
-            'risk_score': validation_result.get('risk_score', 'medium'),
-            'feedback': validation_result.get('feedback', 'Validation completed'),
-            'issues': validation_result.get('issues', []),
-            'recommendation': validation_result.get('recommendation', 'review')
+            'rejected': self.rejected,
+            'approved': self.approved,
+            'escalated': self.escalated,
+            'flagged': self.flagged,
+            'llm_calls_saved': self.rejected + self.approved,
+            'rules': {
+                name: {**stats, 'avg_ms': stats['total_ms'] / stats['evaluated'] if stats['evaluated'] else 0.0}
+                for name, stats in self.rule_stats.items()
+            }
         }
+
+coupon_prescreen = CouponPrescreen(
+    reject_rules=[rule_price_sanity, rule_expiry_not_past, rule_code_format, rule_code_not_listed],
+    flag_rules=[rule_unusual_code_format, rule_similar_code_listed],
+    approve_rule=rule_auto_approve
+)
+
+def validation_log_doc(coupon_id: str, validation_result: dict) -> dict:
+    return {
+        'log_id': f"log_{uuid.uuid4().hex[:12]}",
+        'coupon_id': coupon_id,
+        'risk_score': validation_result['risk_score'],
+        'feedback': validation_result['feedback'],
+        'validation_details': validation_result,
+        'created_at': datetime.now(timezone.utc)
+    }
+
+def coupon_listing_doc(coupon_id: str, seller_id: str, coupon: CouponCreate, verdict: Optional[dict]) -> dict:
+    now = datetime.now(timezone.utc)
+    doc = {
+        'coupon_id': coupon_id,
+        'seller_id': seller_id,
+        'brand_name': coupon.brand_name,
+        'coupon_code': coupon.coupon_code,
+        'expiry_date': coupon.expiry_date,
+        'coupon_value': coupon.coupon_value,
+        'asking_price': coupon.asking_price,
+        'proof_image_url': coupon.proof_image_url,
+        **derived_coupon_fields(coupon.brand_name, coupon.coupon_value, coupon.asking_price),
+        **code_fingerprint_fields(coupon.coupon_code),
+        'expires_at': coupon_expires_at(coupon.expiry_date),
+        'status': coupon_status_for(verdict) if verdict else 'pending',
+        'ai_risk_score': verdict['risk_score'] if verdict else None,
+        'ai_feedback': verdict['feedback'] if verdict else 'Queued for AI validation',
+        'created_at': now,
+        'updated_at': now
+    }
+    if doc['status'] in LIVE_COUPON_STATUSES:
+        doc['live_fingerprint'] = doc['code_fingerprint']
+    return doc
+
+def validation_job_doc(coupon_id: str, coupon: CouponCreate, flags: Optional[List[str]] = None) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        'job_id': f"job_{uuid.uuid4().hex[:12]}",
+        'coupon_id': coupon_id,
+        'payload': coupon.model_dump(),
+        'flags': flags or [],
+        'status': 'queued',
+        'attempts': 0,
+        'last_error': None,
+        'next_attempt_at': now,
+        'locked_at': None,
+        'created_at': now,
+        'updated_at': now
+    }
+
+async def enqueue_validation_job(coupon_id: str, coupon: CouponCreate, flags: Optional[List[str]] = None):
+    await db.validation_jobs.insert_one(validation_job_doc(coupon_id, coupon, flags))
+    validation_workers.notify()
+
+async def claim_validation_job() -> Optional[dict]:
+    """Atomically take the next due job, including ones whose worker died mid-lease"""
+    now = datetime.now(timezone.utc)
+    return await db.validation_jobs.find_one_and_update(
+        {'$or': [
+            {'status': 'queued', 'next_attempt_at': {'$lte': now}},
+            {'status': 'running', 'locked_at': {'$lt': now - timedelta(seconds=VALIDATION_JOB_LEASE)}}
+        ]},
+        {'$set': {'status': 'running', 'locked_at': now, 'updated_at': now}, '$inc': {'attempts': 1}},
+        sort=[('next_attempt_at', ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def finish_validation_job(job: dict, validation_result: dict, job_status: str) -> bool:
+    """Record the verdict, move the coupon out of pending and close the job.
+
+    Does nothing and returns False if the job's lease was lost to another
+    worker; renewing the lock first keeps it ours while the verdict is written.
+    """
+    now = datetime.now(timezone.utc)
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # BSON dates keep milliseconds; the close below matches on it
+    coupon_id = job['coupon_id']
+    
+    renewed = await db.validation_jobs.update_one(
+        {'job_id': job['job_id'], 'status': 'running', 'locked_at': job['locked_at']},
+        {'$set': {'locked_at': now}}
+    )
+    if not renewed.matched_count:
+        logger.warning(f"Validation job {job['job_id']} lost its lease; discarding this verdict")
+        return False
+    
+    new_status = coupon_status_for(validation_result)
+    coupon_update = {'$set': {
+        'status': new_status,
+        'ai_risk_score': validation_result['risk_score'],
+        'ai_feedback': validation_result['feedback'],
+        'updated_at': now
+    }}
+    if new_status not in LIVE_COUPON_STATUSES:
+        coupon_update['$unset'] = {'live_fingerprint': ''}
+    result = await db.coupons.update_one({'coupon_id': coupon_id, 'status': 'pending'}, coupon_update)
+    
+    if result.modified_count:
+        await record_coupon_status_change('pending', new_status)
+    
+    await insert_validation_log(coupon_id, validation_result)
+    
+    await db.validation_jobs.update_one(
+        {'job_id': job['job_id'], 'locked_at': now},
+        {'$set': {'status': job_status, 'result': validation_result, 'locked_at': None, 'updated_at': datetime.now(timezone.utc)}}
+    )
+    invalidate_coupon_responses(coupon_id)
+    return True
+
+class ValidationWorkerPool:
+    """Fixed set of asyncio workers draining the Mongo-backed validation_jobs queue.
+
+    Jobs survive restarts because they live in Mongo; a job left running by
+    a dead process is reclaimed once its lease expires. Failed LLM calls are
+    retried with exponential backoff before falling back to manual review.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.size)]
+        logger.info(f"Started {self.size} AI validation workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, worker_id: int):
+        while True:
+            try:
+                job = await claim_validation_job()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=VALIDATION_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Validation worker {worker_id} error: {e}")
+                await asyncio.sleep(VALIDATION_POLL_INTERVAL)
+
+    async def _process(self, job: dict):
+        try:
+            validation_result = await asyncio.wait_for(
+                run_ai_validation(CouponCreate(**job['payload']), job.get('flags')),
+                timeout=VALIDATION_LLM_TIMEOUT
+            )
+        except Exception as e:
+            error = f"timed out after {VALIDATION_LLM_TIMEOUT:g}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+            if job['attempts'] < VALIDATION_MAX_ATTEMPTS:
+                delay = min(VALIDATION_RETRY_BASE * 2 ** (job['attempts'] - 1), VALIDATION_RETRY_MAX)
+                await db.validation_jobs.update_one(
+                    {'job_id': job['job_id'], 'status': 'running', 'locked_at': job['locked_at']},
+                    {'$set': {
+                        'status': 'queued',
+                        'last_error': error,
+                        'locked_at': None,
+                        'next_attempt_at': datetime.now(timezone.utc) + timedelta(seconds=delay),
+                        'updated_at': datetime.now(timezone.utc)
+                    }}
+                )
+                self.retried += 1
+                logger.warning(f"AI validation of {job['coupon_id']} failed (attempt {job['attempts']}), retrying in {delay}s: {error}")
+                return
+            
+            logger.error(f"AI validation of {job['coupon_id']} gave up after {job['attempts']} attempts: {error}")
+            if await finish_validation_job(job, FALLBACK_VALIDATION, 'failed'):
+                self.failed += 1
+            return
         
-    except Exception as e:
-        logger.error(f"AI validation error: {e}")
+        if await finish_validation_job(job, validation_result, 'done'):
+            self.completed += 1
+
+    def stats(self) -> dict:
         return {
-            'risk_score': 'medium',
-            'feedback': 'Unable to complete AI validation. Manual review recommended.',
-            'issues': ['AI validation service temporarily unavailable'],
-            'recommendation': 'review'
+            'workers': len(self._tasks),
+            'completed': self.completed,
+            'retried': self.retried,
+            'failed': self.failed
         }
 
+validation_workers = ValidationWorkerPool(size=VALIDATION_WORKERS)
+
+bulk_prescreen_semaphore = asyncio.Semaphore(BULK_UPLOAD_CONCURRENCY)
+
+def bulk_upload_format(upload: UploadFile) -> str:
+    name = (upload.filename or '').lower()
+    content_type = (upload.content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type:
+        return 'ndjson'
+    if name.endswith('.json') or 'json' in content_type:
+        return 'json'
+    raise HTTPException(status_code=400, detail="Upload must be a .csv, .json or .ndjson file")
+
+def iter_json_array(stream, read_size: int = 64 * 1024):
+    """Yield the items of a top-level JSON array one at a time, reading the text stream in blocks"""
+    decoder = json.JSONDecoder()
+    buffer, eof = '', False
+    expecting = 'open'
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            if eof:
+                raise ValueError("Unterminated JSON array")
+            buffer = stream.read(read_size)
+            eof = not buffer
+            continue
+        if expecting == 'open':
+            if buffer[0] != '[':
+                raise ValueError("Expected a JSON array")
+            buffer, expecting = buffer[1:], 'first'
+        elif expecting != 'item' and buffer[0] == ']':
+            return
+        elif expecting == 'separator':
+            if buffer[0] != ',':
+                raise ValueError("Expected ',' between array items")
+            buffer, expecting = buffer[1:], 'item'
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                end = None
+            # An item reaching the end of the buffer may be cut short, so read on before trusting it
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise ValueError("Invalid JSON array item")
+                data = stream.read(read_size)
+                eof = not data
+                buffer += data
+                continue
+            yield item
+            buffer, expecting = buffer[end:], 'separator'
+
+def iter_bulk_rows(upload: UploadFile, upload_format: str):
+    """Yield (row_number, fields) from an uploaded file without materialising it.
+
+    CSV and NDJSON are read a line at a time from the spooled upload and a
+    JSON array is decoded an item at a time. fields is None when the row
+    itself could not be decoded; a JSON array that turns malformed part way
+    through ends with one such row.
+    """
+    upload.file.seek(0)
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        if upload_format == 'json':
+            row_number = 0
+            try:
+                for row in iter_json_array(text):
+                    row_number += 1
+                    yield row_number, row if isinstance(row, dict) else None
+            except ValueError:
+                if not row_number:
+                    raise HTTPException(status_code=400, detail="Upload is not a valid JSON array of coupons")
+                yield row_number + 1, None
+        elif upload_format == 'csv':
+            for row_number, row in enumerate(csv.DictReader(text), start=1):
+                yield row_number, {key: value for key, value in row.items() if key and value != ''}
+        else:
+            row_number = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield row_number, row if isinstance(row, dict) else None
+    finally:
+        text.detach()
+
+def upload_size(upload: UploadFile) -> int:
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(0)
+    return size
+
+def read_bulk_chunk(rows, size: int) -> tuple:
+    """Decode and validate the next size upload rows; blocking, so the route runs it in the threadpool.
+
+    Returns (valid, errors, done): (row_number, CouponCreate) pairs, report
+    lines for rows that failed, and whether the upload is exhausted.
+    """
+    valid, errors = [], []
+    for row_number, fields in rows:
+        if row_number > BULK_UPLOAD_MAX_ROWS:
+            errors.append({'row': row_number, 'status': 'error', 'error': f"Uploads are limited to {BULK_UPLOAD_MAX_ROWS} rows; this and later rows were not processed"})
+            return valid, errors, True
+        if fields is None:
+            errors.append({'row': row_number, 'status': 'error', 'error': 'Row could not be decoded as a coupon object'})
+        else:
+            try:
+                valid.append((row_number, CouponCreate(**fields)))
+            except ValidationError as e:
+                errors.append({'row': row_number, 'status': 'error', 'error': '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())})
+        if len(valid) + len(errors) >= size:
+            return valid, errors, False
+    return valid, errors, True
+
+async def prescreen_bulk_row(coupon_id: str, coupon: CouponCreate) -> tuple:
+    async with bulk_prescreen_semaphore:
+        return await coupon_prescreen.evaluate(coupon, coupon_id)
+
+async def insert_listing_docs(docs: List[dict]) -> dict:
+    """insert_many that keeps going past bad rows; returns {index: write error} for the ones that failed"""
+    if not docs:
+        return {}
+    try:
+        await db.coupons.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        return {error['index']: error for error in e.details.get('writeErrors', [])}
+    return {}
+
+async def insert_bulk_chunk(seller_id: str, rows: List[tuple], seen_codes: dict) -> List[dict]:
+    """Pre-screen, insert and enqueue one chunk of parsed upload rows; returns its report lines"""
+    report = {}
+    candidates = []
+    for row_number, coupon in rows:
+        fingerprint = code_fingerprint_fields(coupon.coupon_code)['code_fingerprint']
+        if fingerprint in seen_codes:
+            report[row_number] = {'row': row_number, 'status': 'error', 'error': f"Duplicate of row {seen_codes[fingerprint]} in this upload"}
+            continue
+        seen_codes[fingerprint] = row_number
+        candidates.append((row_number, f"cpn_{uuid.uuid4().hex[:12]}", coupon))
+    
+    outcomes = await asyncio.gather(*(prescreen_bulk_row(coupon_id, coupon) for _, coupon_id, coupon in candidates))
+    docs = [
+        coupon_listing_doc(coupon_id, seller_id, coupon, verdict)
+        for (_, coupon_id, coupon), (verdict, _) in zip(candidates, outcomes)
+    ]
+    
+    failed = await insert_listing_docs(docs)
+    conflicts = [index for index, error in failed.items() if is_live_code_conflict(error)]
+    if conflicts:
+        # Another request listed the same code between the pre-screen read and this insert
+        for index in conflicts:
+            _, coupon_id, coupon = candidates[index]
+            outcomes[index] = (DUPLICATE_CODE_VERDICT, [])
+            docs[index] = coupon_listing_doc(coupon_id, seller_id, coupon, DUPLICATE_CODE_VERDICT)
+        retry_failed = await insert_listing_docs([docs[index] for index in conflicts])
+        for position, index in enumerate(conflicts):
+            if position in retry_failed:
+                failed[index] = retry_failed[position]
+            else:
+                del failed[index]
+    failed = {index: error.get('errmsg', 'Insert failed') for index, error in failed.items()}
+    
+    logs, jobs = [], []
+    counters = {}
+    for index, ((row_number, coupon_id, coupon), (verdict, flags), doc) in enumerate(zip(candidates, outcomes, docs)):
+        if index in failed:
+            report[row_number] = {'row': row_number, 'status': 'error', 'error': failed[index]}
+            continue
+        report[row_number] = {'row': row_number, 'coupon_id': coupon_id, 'status': doc['status'], 'feedback': doc['ai_feedback']}
+        counters['total_coupons'] = counters.get('total_coupons', 0) + 1
+        counters[f"coupons_{doc['status']}"] = counters.get(f"coupons_{doc['status']}", 0) + 1
+        if verdict:
+            logs.append(validation_log_doc(coupon_id, verdict))
+            if verdict['risk_score'] == 'high':
+                counters['fraud_attempts'] = counters.get('fraud_attempts', 0) + 1
+        else:
+            jobs.append(validation_job_doc(coupon_id, coupon, flags))
+    
+    writes = [record_analytics(counters, {'fraud_attempts': counters['fraud_attempts']} if 'fraud_attempts' in counters else None)]
+    if logs:
+        writes.append(db.ai_validation_logs.insert_many(logs, ordered=False))
+    if jobs:
+        writes.append(db.validation_jobs.insert_many(jobs, ordered=False))
+    await asyncio.gather(*writes)
+    if jobs:
+        validation_workers.notify()
+    
+    return [report[row_number] for row_number in sorted(report)]
+
+@api_router.post("/coupons/validate")
+async def validate_coupon(coupon: CouponCreate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """AI validation of coupon before submission"""
+    user = await get_current_user(authorization, session_token)
+    
+    verdict, flags = await coupon_prescreen.evaluate(coupon)
+    if verdict is not None:
+        return verdict
+    
+    try:
+        return await run_ai_validation(coupon, flags)
+    except Exception as e:
+        logger.error(f"AI validation error: {e}")
+        return {**FALLBACK_VALIDATION, 'issues': flags + FALLBACK_VALIDATION['issues']}
+
 @api_router.post("/coupons", response_model=Coupon)
 async def create_coupon(coupon: CouponCreate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
-    \"\"\"Create new coupon listing\"\"\"
+    """Create new coupon listing; AI validation runs in the background"""
     user = await get_current_user(authorization, session_token)
     
     if user.role not in ['seller', 'admin']:
         raise HTTPException(status_code=403, detail="Only sellers can create coupons")
     
-    validation_result = await validate_coupon(coupon, authorization, session_token)
-    
     coupon_id = f"cpn_{uuid.uuid4().hex[:12]}"
+    verdict, flags = await coupon_prescreen.evaluate(coupon, coupon_id)
+    coupon_doc = coupon_listing_doc(coupon_id, user.user_id, coupon, verdict)
     
-    status = 'pending'
-    if validation_result['risk_score'] == 'low' and validation_result['recommendation'] == 'approve':
-        status = 'approved'
-    elif validation_result['risk_score'] == 'high' or validation_result['recommendation'] == 'reject':
-        status = 'rejected'
+    try:
+        await db.coupons.insert_one(coupon_doc)
+    except DuplicateKeyError as e:
+        if not is_live_code_conflict(e.details or {}):
+            raise
+        verdict = DUPLICATE_CODE_VERDICT
+        coupon_doc = coupon_listing_doc(coupon_id, user.user_id, coupon, verdict)
+        await db.coupons.insert_one(coupon_doc)
+    await record_analytics({'total_coupons': 1, f"coupons_{coupon_doc['status']}": 1})
+    if verdict:
+        await insert_validation_log(coupon_id, verdict)
+        invalidate_coupon_responses()
+    else:
+        await enqueue_validation_job(coupon_id, coupon, flags)
     
-    coupon_doc = {
-        'coupon_id': coupon_id,
-        'seller_id': user.user_id,
-        'brand_name': coupon.brand_name,
-        'coupon_code': coupon.coupon_code,
-        'expiry_date': coupon.expiry_date,
-        'coupon_value': coupon.coupon_value,
-        'asking_price': coupon.asking_price,
-        'proof_image_url': coupon.proof_image_url,
-        'status': status,
-        'ai_risk_score': validation_result['risk_score'],
-        'ai_feedback': validation_result['feedback'],
-        'created_at': datetime.now(timezone.utc),
-        'updated_at': datetime.now(timezone.utc)
-    }
+    return Coupon(**coupon_doc)
+
+@api_router.post("/coupons/bulk")
+async def bulk_create_coupons(file: UploadFile = File(...), authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Create many coupon listings from a CSV, JSON or NDJSON upload.
+
+    The file is decoded BULK_UPLOAD_CHUNK_SIZE rows at a time in the
+    threadpool, so parsing never blocks the event loop; each chunk is then
+    pre-screened concurrently and written with insert_many, so memory stays
+    bounded by the chunk rather than the upload. Rows the pre-screen cannot settle are queued for AI
+    validation exactly like single listings. Uploads larger than
+    BULK_UPLOAD_MAX_BYTES are refused before parsing; rows past
+    BULK_UPLOAD_MAX_ROWS are reported and not processed. The response
+    reports the outcome of every row.
+    """
+    user = await get_current_user(authorization, session_token)
     
-    await db.coupons.insert_one(coupon_doc)
+    if user.role not in ['seller', 'admin']:
+        raise HTTPException(status_code=403, detail="Only sellers can create coupons")
     
-    log_doc = {
-        'log_id': f"log_{uuid.uuid4().hex[:12]}",
-        'coupon_id': coupon_id,
-        'risk_score': validation_result['risk_score'],
-        'feedback': validation_result['feedback'],
-        'validation_details': validation_result,
-        'created_at': datetime.now(timezone.utc)
-    }
-    await db.ai_validation_logs.insert_one(log_doc)
+    upload_format = bulk_upload_format(file)
+    if upload_size(file) > BULK_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {BULK_UPLOAD_MAX_BYTES} bytes")
     
-    return Coupon(**coupon_doc)
+    results = []
+    seen_codes = {}
+    rows = iter_bulk_rows(file, upload_format)
+    try:
+        done = False
+        while not done:
+            chunk, errors, done = await run_in_threadpool(read_bulk_chunk, rows, BULK_UPLOAD_CHUNK_SIZE)
+            results.extend(errors)
+            if chunk:
+                results.extend(await insert_bulk_chunk(user.user_id, chunk, seen_codes))
+    finally:
+        rows.close()
+    
+    results.sort(key=lambda result: result['row'])
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    if any(result['status'] in ('approved', 'rejected') for result in results):
+        invalidate_coupon_responses()
+    
+    return {'total': len(results), 'summary': summary, 'results': results}
 
 @api_router.get("/coupons", response_model=List[Coupon])
 async def get_coupons(
+    request: Request,
     brand: Optional[str] = None,
     status: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
+    expires_after: Optional[datetime] = None,
+    sort: Literal['newest', 'price_asc', 'price_desc', 'discount', 'expiring'] = 'newest',
+    cursor: Optional[str] = None,
     limit: int = 50
 ):
-    \"\"\"Get coupons with filters (public endpoint for browsing)\"\"\"
+    """Get coupons with filters (public endpoint for browsing).
+
+    Results are keyset-paginated; when more rows exist the opaque cursor for
+    the next page is returned in the X-Next-Cursor header. expires_after keeps
+    only coupons still valid at that moment; approved listings and the
+    expiring sort imply it for the current time, so like search they leave
+    out coupons that have lapsed or whose expiry could not be read.
+    """
+    cache_key = response_cache_key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached.to_response(request)
+    
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
     query = {}
     
     if brand:
-        query['brand_name'] = {'$regex': brand, '$options': 'i'}
+        query['brand_key'] = {'$regex': '^' + re.escape(normalize_brand(brand))}
     
     if status:
         query['status'] = status
@@ -390,34 +2421,151 @@ async def get_coupons(
         query['asking_price'] = query.get('asking_price', {})
         query['asking_price']['$lte'] = max_price
     
-    coupons = await db.coupons.find(query, {'_id': 0}).limit(limit).to_list(limit)
+    if expires_after is None and (sort == 'expiring' or query['status'] == 'approved'):
+        expires_after = datetime.now(timezone.utc)
+    if expires_after is not None:
+        query['expires_at'] = {'$gt': expires_after if expires_after.tzinfo else expires_after.replace(tzinfo=timezone.utc)}
     
-    for coupon in coupons:
-        if coupon['status'] != 'sold':
-            coupon['coupon_code'] = '****' + coupon['coupon_code'][-4:] if len(coupon['coupon_code']) > 4 else '****'
+    field, direction = COUPON_SORTS[sort]
+    coupons, next_cursor = await fetch_keyset_page(
+        db.coupons, query, sort, field, direction, 'coupon_id', cursor, limit, projection=PUBLIC_COUPON_PROJECTION
+    )
+    
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+    await attach_ratings(coupons)
+    
+    entry = response_cache.put(cache_key, dump_response(Coupon, coupons), tags=('coupon_list',), headers=headers)
+    return entry.to_response(request)
+
+@api_router.get("/coupons/search")
+async def search_coupons(
+    request: Request,
+    q: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_discount: Optional[float] = None,
+    offset: int = 0,
+    limit: int = 20
+):
+    """Full-text search over approved, unexpired coupons with facet counts.
+
+    q runs against the coupons text index and orders results by relevance;
+    without it results are newest first. One $facet aggregation returns the
+    page, the total and the brand, price and discount counts for the same
+    filtered set. min_discount is a percent-off threshold.
+    """
+    cache_key = response_cache_key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached.to_response(request)
+    
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = max(0, min(offset, MAX_SEARCH_OFFSET))
+    query = {'status': 'approved', 'expires_at': {'$gt': datetime.now(timezone.utc)}}
+    if q and q.strip():
+        query['$text'] = {'$search': q.strip()}
+    if brand:
+        query['brand_key'] = normalize_brand(brand)
+    if min_price is not None or max_price is not None:
+        query['asking_price'] = {}
+        if min_price is not None:
+            query['asking_price']['$gte'] = min_price
+        if max_price is not None:
+            query['asking_price']['$lte'] = max_price
+    if min_discount is not None and 0 <= min_discount < 100:
+        query['discount_ratio'] = {'$gte': discount_ratio_for(min_discount)}
+    
+    discount_boundaries = [0] + [discount_ratio_for(p) for p in DISCOUNT_FACET_PERCENTS] + [float('inf')]
+    pipeline = [{'$match': query}]
+    if '$text' in query:
+        pipeline.append({'$addFields': {'score': {'$meta': 'textScore'}}})
+        ordering = {'score': DESCENDING, 'created_at': DESCENDING, 'coupon_id': DESCENDING}
+    else:
+        ordering = {'created_at': DESCENDING, 'coupon_id': DESCENDING}
+    pipeline.append(
+        {'$facet': {
+            'results': [
+                {'$sort': ordering},
+                {'$skip': offset},
+                {'$limit': limit},
+                {'$project': PUBLIC_COUPON_PROJECTION}
+            ],
+            'total': [{'$count': 'n'}],
+            'brands': [
+                {'$group': {'_id': '$brand_key', 'brand_name': {'$first': '$brand_name'}, 'count': {'$sum': 1}}},
+                {'$sort': {'count': DESCENDING, '_id': ASCENDING}},
+                {'$limit': BRAND_FACET_LIMIT}
+            ],
+            'price': [{'$bucket': {
+                'groupBy': '$asking_price',
+                'boundaries': PRICE_FACET_BOUNDARIES + [float('inf')],
+                'default': 'other',
+                'output': {'count': {'$sum': 1}}
+            }}],
+            'discount': [{'$bucket': {
+                'groupBy': '$discount_ratio',
+                'boundaries': discount_boundaries,
+                'default': 'other',
+                'output': {'count': {'$sum': 1}}
+            }}]
+        }}
+    )
+    facets = (await db.coupons.aggregate(pipeline).to_list(1))[0]
     
-    return [Coupon(**c) for c in coupons]
+    coupons = facets['results']
+    await attach_ratings(coupons)
+    
+    result = {
+        'results': response_rows(Coupon, coupons),
+        'total': facets['total'][0]['n'] if facets['total'] else 0,
+        'offset': offset,
+        'limit': limit,
+        'facets': {
+            'brands': [{'brand': row['brand_name'], 'count': row['count']} for row in facets['brands']],
+            'price': facet_buckets(
+                facets['price'], PRICE_FACET_BOUNDARIES + [None],
+                lambda lower, upper: {'min': lower, 'max': upper}
+            ),
+            'discount': facet_buckets(
+                facets['discount'], discount_boundaries[1:],
+                lambda lower, upper: {'min_percent': round(100 * (1 - 1 / lower)), 'max_percent': round(100 * (1 - 1 / upper)) if upper != float('inf') else None}
+            )
+        }
+    }
+    entry = response_cache.put(cache_key, pydantic_core.to_json(result), tags=('coupon_list',))
+    return entry.to_response(request)
 
 @api_router.get("/coupons/my", response_model=List[Coupon])
 async def get_my_coupons(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
-    \"\"\"Get coupons created by current user (seller)\"\"\"
+    """Get coupons created by current user (seller)"""
     user = await get_current_user(authorization, session_token)
     
-    coupons = await db.coupons.find({'seller_id': user.user_id}, {'_id': 0}).to_list(100)
-    return [Coupon(**c) for c in coupons]
+    coupons = await db.coupons.find({'seller_id': user.user_id}, response_projection(Coupon)).to_list(100)
+    return json_rows_response(Coupon, coupons)
 
 @api_router.get("/coupons/{coupon_id}", response_model=Coupon)
-async def get_coupon(coupon_id: str):
-    \"\"\"Get specific coupon details\"\"\"
-    coupon = await db.coupons.find_one({'coupon_id': coupon_id}, {'_id': 0})
+async def get_coupon(coupon_id: str, request: Request):
+    """Get specific coupon details"""
+    cache_key = response_cache_key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached.to_response(request)
     
-    if not coupon:
+    coupons = await db.coupons.aggregate([
+        {'$match': {'coupon_id': coupon_id}},
+        {'$limit': 1},
+        {'$project': PUBLIC_COUPON_PROJECTION}
+    ]).to_list(1)
+    
+    if not coupons:
         raise HTTPException(status_code=404, detail="Coupon not found")
     
-    if coupon['status'] != 'sold':
-        coupon['coupon_code'] = '****' + coupon['coupon_code'][-4:] if len(coupon['coupon_code']) > 4 else '****'
+    coupon = coupons[0]
+    await attach_ratings([coupon])
     
-    return Coupon(**coupon)
+    entry = response_cache.put(cache_key, dump_response(Coupon, coupon), tags=(f"coupon:{coupon_id}", f"seller:{coupon['seller_id']}"))
+    return entry.to_response(request)
 
 @api_router.post("/checkout/session")
 async def create_checkout(
@@ -426,7 +2574,7 @@ async def create_checkout(
     authorization: Optional[str] = Header(None),
     session_token: Optional[str] = Cookie(None)
 ):
-    \"\"\"Create Stripe checkout session for coupon purchase\"\"\"
+    """Create Stripe checkout session for coupon purchase"""
     user = await get_current_user(authorization, session_token)
     
     coupon = await db.coupons.find_one({'coupon_id': coupon_id}, {'_id': 0})
@@ -436,17 +2584,135 @@ async def create_checkout(
     if coupon['status'] != 'approved':
         raise HTTPException(status_code=400, detail="Coupon not available for purchase")
     
+    if coupon.get('expires_at') and coupon['expires_at'].replace(tzinfo=timezone.utc) <= datetime.now(timezone.utc):
+        raise HTTPException(status_code=400, detail="Coupon has expired")
+    
     body = await request.json()
     origin_url = body.get('origin_url')
     
     if not origin_url:
         raise HTTPException(status_code=400, detail="origin_url is required")
     
-    success_url = f\"{origin_url}/payment/success?session_id={{CHECKOUT_SESSION_ID}}\"\n    cancel_url = f\"{origin_url}/payment/cancel\"\n    \n    host_url = str(request.base_url).rstrip('/')\n    webhook_url = f\"{host_url}/api/webhook/stripe\"\n    \n    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)\n    \n    checkout_request = CheckoutSessionRequest(\n        amount=float(coupon['asking_price']),\n        currency='usd',\n        success_url=success_url,\n        cancel_url=cancel_url,\n        metadata={\n            'user_id': user.user_id,\n            'coupon_id': coupon_id,\n            'seller_id': coupon['seller_id']\n        }\n    )\n    \n    session: CheckoutSessionResponse = await stripe_checkout.create_checkout_session(checkout_request)\n    \n    payment_id = f\"pmt_{uuid.uuid4().hex[:12]}\"\n    payment_doc = {\n        'payment_id': payment_id,\n        'user_id': user.user_id,\n        'coupon_id': coupon_id,\n        'session_id': session.session_id,\n        'amount': coupon['asking_price'],\n        'currency': 'usd',\n        'payment_status': 'initiated',\n        'created_at': datetime.now(timezone.utc),\n        'updated_at': datetime.now(timezone.utc)\n    }\n    await db.payment_transactions.insert_one(payment_doc)\n    \n    return {'url': session.url, 'session_id': session.session_id}
+    success_url = f"{origin_url}/payment/success?session_id={{CHECKOUT_SESSION_ID}}"
+    cancel_url = f"{origin_url}/payment/cancel"
+    
+    host_url = str(request.base_url).rstrip('/')
+    webhook_url = f"{host_url}/api/webhook/stripe"
+    
+    stripe_checkout = outbound.stripe(webhook_url)
+    
+    checkout_request = CheckoutSessionRequest(
+        amount=float(coupon['asking_price']),
+        currency='usd',
+        success_url=success_url,
+        cancel_url=cancel_url,
+        metadata={
+            'user_id': user.user_id,
+            'coupon_id': coupon_id,
+            'seller_id': coupon['seller_id']
+        }
+    )
+    
+    with time_outbound('stripe'):
+        session: CheckoutSessionResponse = await stripe_checkout.create_checkout_session(checkout_request)
+    
+    payment_id = f"pmt_{uuid.uuid4().hex[:12]}"
+    payment_doc = {
+        'payment_id': payment_id,
+        'user_id': user.user_id,
+        'coupon_id': coupon_id,
+        'seller_id': coupon['seller_id'],
+        'session_id': session.session_id,
+        'amount': coupon['asking_price'],
+        'currency': 'usd',
+        'payment_status': 'initiated',
+        'created_at': datetime.now(timezone.utc),
+        'updated_at': datetime.now(timezone.utc)
+    }
+    await db.payment_transactions.insert_one(payment_doc)
+    
+    return {'url': session.url, 'session_id': session.session_id}
+
+async def record_sale_analytics(session_id: str):
+    """Count a settled sale in the rollups exactly once.
+
+    The escrow row carries analytics_pending until its increment lands;
+    whoever clears the flag records the sale, and puts the flag back if
+    that fails so the next settle attempt for the session retries it.
+    """
+    transaction = await db.transactions.find_one_and_update(
+        {'session_id': session_id, 'analytics_pending': True},
+        {'$unset': {'analytics_pending': ''}},
+        projection={'_id': 0, 'amount': 1, 'created_at': 1}
+    )
+    if transaction is None:
+        return
+    try:
+        await record_analytics(
+            {'total_transactions': 1, 'total_sales': transaction['amount']},
+            {'sales_count': 1, 'sales_amount': transaction['amount']},
+            day=transaction['created_at']
+        )
+    except Exception:
+        await db.transactions.update_one({'session_id': session_id}, {'$set': {'analytics_pending': True}})
+        raise
+
+async def settle_checkout(payment: dict) -> dict:
+    """Record a paid checkout: one escrow transaction, payment marked paid, coupon marked sold.
+
+    Idempotent and safe under concurrent status polls and webhook deliveries:
+    the escrow row is keyed by the unique transactions.session_id index, so
+    only the first insert lands, and the two status flips are plain
+    conditional updates that converge if repeated.
+    """
+    now = datetime.now(timezone.utc)
+    coupon_id = payment['coupon_id']
+    
+    seller_id = payment.get('seller_id')
+    if seller_id is None:
+        coupon = await db.coupons.find_one({'coupon_id': coupon_id}, {'_id': 0, 'seller_id': 1})
+        seller_id = coupon['seller_id']
+    
+    transaction_doc = {
+        'transaction_id': f"txn_{uuid.uuid4().hex[:12]}",
+        'session_id': payment['session_id'],
+        'buyer_id': payment['user_id'],
+        'seller_id': seller_id,
+        'coupon_id': coupon_id,
+        'amount': payment['amount'],
+        'platform_commission': payment['amount'] * 0.10,
+        'status': 'escrow',
+        'created_at': now,
+        'completed_at': None
+    }
+    try:
+        await db.transactions.insert_one({**transaction_doc, 'analytics_pending': True})
+    except DuplicateKeyError:
+        pass
+    await record_sale_analytics(payment['session_id'])
+    
+    settled_payment, previous_coupon = await asyncio.gather(
+        db.payment_transactions.find_one_and_update(
+            {'session_id': payment['session_id']},
+            {'$set': {'payment_status': 'paid', 'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        ),
+        db.coupons.find_one_and_update(
+            {'coupon_id': coupon_id, 'status': {'$ne': 'sold'}},
+            {'$set': {'status': 'sold', 'updated_at': now}},
+            projection={'status': 1}
+        )
+    )
+    if previous_coupon:
+        await record_coupon_status_change(previous_coupon['status'], 'sold')
+    invalidate_coupon_responses(coupon_id)
+    
+    settled_payment.pop('_id', None)
+    return settled_payment
 
 @api_router.get("/checkout/status/{session_id}")
 async def get_checkout_status(session_id: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
-    \"\"\"Get payment status for a session\"\"\"
+    """Get payment status for a session"""
     user = await get_current_user(authorization, session_token)
     
     payment = await db.payment_transactions.find_one({'session_id': session_id}, {'_id': 0})
@@ -459,50 +2725,894 @@ async def get_checkout_status(session_id: str, authorization: Optional[str] = He
     if payment['payment_status'] in ['paid', 'failed', 'expired']:
         return payment
     
-    webhook_url = f\"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe\"\n    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)\n    \n    try:\n        status: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)\n        \n        new_payment_status = 'paid' if status.payment_status == 'paid' else 'pending'\n        \n        if new_payment_status == 'paid' and payment['payment_status'] != 'paid':\n            await db.payment_transactions.update_one(\n                {'session_id': session_id},\n                {'$set': {'payment_status': 'paid', 'updated_at': datetime.now(timezone.utc)}}\n            )\n            \n            coupon = await db.coupons.find_one({'coupon_id': payment['coupon_id']}, {'_id': 0})\n            \n            transaction_id = f\"txn_{uuid.uuid4().hex[:12]}\"\n            transaction_doc = {\n                'transaction_id': transaction_id,\n                'buyer_id': user.user_id,\n                'seller_id': coupon['seller_id'],\n                'coupon_id': payment['coupon_id'],\n                'amount': payment['amount'],\n                'platform_commission': payment['amount'] * 0.10,\n                'status': 'escrow',\n                'created_at': datetime.now(timezone.utc),\n                'completed_at': None\n            }\n            await db.transactions.insert_one(transaction_doc)\n            \n            await db.coupons.update_one(\n                {'coupon_id': payment['coupon_id']},\n                {'$set': {'status': 'sold', 'updated_at': datetime.now(timezone.utc)}}\n            )\n        \n        payment = await db.payment_transactions.find_one({'session_id': session_id}, {'_id': 0})\n        return payment\n        \n    except Exception as e:\n        logger.error(f\"Error checking payment status: {e}\")\n        return payment
+    webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
+    stripe_checkout = outbound.stripe(webhook_url)
+    
+    try:
+        with time_outbound('stripe'):
+            status: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
+        
+        if status.payment_status == 'paid':
+            return await settle_checkout(payment)
+        return payment
+        
+    except Exception as e:
+        logger.error(f"Error checking payment status: {e}")
+        return payment
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
-    \"\"\"Handle Stripe webhook events\"\"\"
-    body = await request.body()\n    signature = request.headers.get('Stripe-Signature')\n    \n    webhook_url = f\"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe\"\n    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)\n    \n    try:\n        event = await stripe_checkout.handle_webhook(body, signature)\n        logger.info(f\"Stripe webhook: {event.event_type}\")\n        \n        if event.event_type == 'checkout.session.completed':\n            await db.payment_transactions.update_one(\n                {'session_id': event.session_id},\n                {'$set': {'payment_status': 'paid', 'updated_at': datetime.now(timezone.utc)}}\n            )\n        \n        return {'status': 'success'}\n    except Exception as e:\n        logger.error(f\"Webhook error: {e}\")\n        raise HTTPException(status_code=400, detail=str(e))
+    """Handle Stripe webhook events"""
+    body = await request.body()
+    signature = request.headers.get('Stripe-Signature')
+    
+    webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
+    stripe_checkout = outbound.stripe(webhook_url)
+    
+    try:
+        with time_outbound('stripe'):
+            event = await stripe_checkout.handle_webhook(body, signature)
+        logger.info(f"Stripe webhook: {event.event_type}")
+        
+        if event.event_type == 'checkout.session.completed':
+            payment = await db.payment_transactions.find_one({'session_id': event.session_id}, {'_id': 0})
+            if payment:
+                await settle_checkout(payment)
+            else:
+                logger.warning(f"Stripe webhook for unknown session {event.session_id}")
+        
+        return {'status': 'success'}
+    except Exception as e:
+        logger.error(f"Webhook error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.get("/transactions/my", response_model=List[Transaction])
-async def get_my_transactions(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Get transactions for current user\"\"\"
-    user = await get_current_user(authorization, session_token)\n    \n    query = {'$or': [{'buyer_id': user.user_id}, {'seller_id': user.user_id}]}\n    transactions = await db.transactions.find(query, {'_id': 0}).to_list(100)\n    \n    return [Transaction(**t) for t in transactions]
+async def get_my_transactions(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Get transactions for current user"""
+    user = await get_current_user(authorization, session_token)
+    
+    query = {'$or': [{'buyer_id': user.user_id}, {'seller_id': user.user_id}]}
+    transactions = await db.transactions.find(query, response_projection(Transaction)).to_list(100)
+    
+    return json_rows_response(Transaction, transactions)
 
 @api_router.get("/transactions/{transaction_id}/coupon-code")
-async def get_coupon_code(transaction_id: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Reveal coupon code after successful payment\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    transaction = await db.transactions.find_one({'transaction_id': transaction_id}, {'_id': 0})\n    if not transaction:\n        raise HTTPException(status_code=404, detail=\"Transaction not found\")\n    \n    if transaction['buyer_id'] != user.user_id:\n        raise HTTPException(status_code=403, detail=\"Access denied\")\n    \n    if transaction['status'] not in ['escrow', 'completed']:\n        raise HTTPException(status_code=400, detail=\"Payment not completed\")\n    \n    coupon = await db.coupons.find_one({'coupon_id': transaction['coupon_id']}, {'_id': 0})\n    if not coupon:\n        raise HTTPException(status_code=404, detail=\"Coupon not found\")\n    \n    return {'coupon_code': coupon['coupon_code'], 'brand_name': coupon['brand_name'], 'expiry_date': coupon['expiry_date']}
+async def get_coupon_code(transaction_id: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Reveal coupon code after successful payment"""  
+    user = await get_current_user(authorization, session_token)
+    
+    transaction = await db.transactions.find_one({'transaction_id': transaction_id}, {'_id': 0})
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    if transaction['buyer_id'] != user.user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if transaction['status'] not in ['escrow', 'completed']:
+        raise HTTPException(status_code=400, detail="Payment not completed")
+    
+    coupon = await db.coupons.find_one({'coupon_id': transaction['coupon_id']}, {'_id': 0})
+    if not coupon:
+        raise HTTPException(status_code=404, detail="Coupon not found")
+    
+    return {'coupon_code': coupon['coupon_code'], 'brand_name': coupon['brand_name'], 'expiry_date': coupon['expiry_date']}
 
 @api_router.post("/transactions/{transaction_id}/confirm")
-async def confirm_transaction(transaction_id: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Buyer confirms coupon worked - releases payment from escrow\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    transaction = await db.transactions.find_one({'transaction_id': transaction_id}, {'_id': 0})\n    if not transaction:\n        raise HTTPException(status_code=404, detail=\"Transaction not found\")\n    \n    if transaction['buyer_id'] != user.user_id:\n        raise HTTPException(status_code=403, detail=\"Access denied\")\n    \n    if transaction['status'] != 'escrow':\n        raise HTTPException(status_code=400, detail=\"Transaction not in escrow\")\n    \n    payout_amount = transaction['amount'] - transaction['platform_commission']\n    \n    await db.users.update_one(\n        {'user_id': transaction['seller_id']},\n        {'$inc': {'wallet_balance': payout_amount}}\n    )\n    \n    await db.transactions.update_one(\n        {'transaction_id': transaction_id},\n        {'$set': {'status': 'completed', 'completed_at': datetime.now(timezone.utc)}}\n    )\n    \n    return {'message': 'Transaction completed', 'seller_payout': payout_amount}
+async def confirm_transaction(transaction_id: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Buyer confirms coupon worked - releases payment from escrow"""  
+    user = await get_current_user(authorization, session_token)
+    
+    transaction = await db.transactions.find_one({'transaction_id': transaction_id}, {'_id': 0})
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    if transaction['buyer_id'] != user.user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Only the request that moves the transaction out of escrow pays the seller; a dispute opened first wins.
+    # payout_pending stays set until the credit is recorded, so recover_wallet_credits can finish it after a crash.
+    completed = await db.transactions.find_one_and_update(
+        {'transaction_id': transaction_id, 'status': 'escrow'},
+        {'$set': {'status': 'completed', 'completed_at': datetime.now(timezone.utc), 'payout_pending': True}},
+        projection={'_id': 0, 'transaction_id': 1, 'seller_id': 1, 'amount': 1, 'platform_commission': 1}
+    )
+    if completed is None:
+        raise HTTPException(status_code=400, detail="Transaction not in escrow")
+    
+    payout_amount = transaction['amount'] - transaction['platform_commission']
+    await pay_out_sales([completed])
+    
+    return {'message': 'Transaction completed', 'seller_payout': payout_amount}
 
 @api_router.post("/reviews", response_model=Review)
-async def create_review(review: ReviewCreate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Create review for a coupon purchase\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    transaction = await db.transactions.find_one({'coupon_id': review.coupon_id, 'buyer_id': user.user_id}, {'_id': 0})\n    if not transaction:\n        raise HTTPException(status_code=403, detail=\"You haven't purchased this coupon\")\n    \n    coupon = await db.coupons.find_one({'coupon_id': review.coupon_id}, {'_id': 0})\n    if not coupon:\n        raise HTTPException(status_code=404, detail=\"Coupon not found\")\n    \n    review_id = f\"rev_{uuid.uuid4().hex[:12]}\"\n    review_doc = {\n        'review_id': review_id,\n        'buyer_id': user.user_id,\n        'coupon_id': review.coupon_id,\n        'seller_id': coupon['seller_id'],\n        'rating': review.rating,\n        'comment': review.comment,\n        'created_at': datetime.now(timezone.utc)\n    }\n    \n    await db.reviews.insert_one(review_doc)\n    return Review(**review_doc)
+async def create_review(review: ReviewCreate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Create review for a coupon purchase"""  
+    user = await get_current_user(authorization, session_token)
+    
+    transaction = await db.transactions.find_one({'coupon_id': review.coupon_id, 'buyer_id': user.user_id}, {'_id': 0})
+    if not transaction:
+        raise HTTPException(status_code=403, detail="You haven't purchased this coupon")
+    
+    coupon = await db.coupons.find_one({'coupon_id': review.coupon_id}, {'_id': 0})
+    if not coupon:
+        raise HTTPException(status_code=404, detail="Coupon not found")
+    
+    review_id = f"rev_{uuid.uuid4().hex[:12]}"
+    review_doc = {
+        'review_id': review_id,
+        'buyer_id': user.user_id,
+        'coupon_id': review.coupon_id,
+        'seller_id': coupon['seller_id'],
+        'rating': review.rating,
+        'comment': review.comment,
+        'created_at': datetime.now(timezone.utc)
+    }
+    
+    await db.reviews.insert_one(review_doc)
+    # Not one transaction: if the $inc is lost, rating_reconciler folds the review in later
+    await record_review_rating(coupon['seller_id'], review.coupon_id, review.rating)
+    response_cache.invalidate(f"reviews:{review.coupon_id}", f"seller:{coupon['seller_id']}", 'coupon_list')
+    return Review(**review_doc)
+
+@api_router.get("/reviews/{coupon_id}", response_model=List[Review])
+async def get_coupon_reviews(coupon_id: str, request: Request):
+    """Get all reviews for a coupon"""  
+    cache_key = response_cache_key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached.to_response(request)
+    
+    reviews = await db.reviews.find({'coupon_id': coupon_id}, response_projection(Review)).to_list(100)
+    entry = response_cache.put(cache_key, dump_response(Review, reviews), tags=(f"reviews:{coupon_id}",))
+    return entry.to_response(request)
+
+@api_router.get("/wallet")
+async def get_wallet(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Get user wallet balance (materialized on the user row, so no ledger read).
+
+    Read from the row rather than the cached session user, whose copy can
+    lag writes made by other processes.
+    """
+    user = await get_current_user(authorization, session_token)
+    row = await db.users.find_one({'user_id': user.user_id}, {'_id': 0, 'wallet_balance': 1})
+    return {'wallet_balance': (row or {}).get('wallet_balance', 0.0), 'user_id': user.user_id}
+
+@api_router.get("/wallet/ledger", response_model=List[LedgerEntry])
+async def get_wallet_ledger(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    authorization: Optional[str] = Header(None),
+    session_token: Optional[str] = Cookie(None)
+):
+    """Get the current user's ledger entries, newest first; next cursor in X-Next-Cursor"""
+    user = await get_current_user(authorization, session_token)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    entries, next_cursor = await fetch_keyset_page(
+        db.wallet_ledger, {'user_id': user.user_id}, 'ledger', 'created_at', DESCENDING, 'entry_id', cursor, limit,
+        projection=response_projection(LedgerEntry)
+    )
+    return json_rows_response(LedgerEntry, entries, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
+
+@api_router.post("/wallet/withdraw")
+async def withdraw_funds(withdraw: WithdrawRequest, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Request withdrawal; the amount is held from the balance until an admin settles it"""  
+    user = await get_current_user(authorization, session_token)
+    
+    amount = round(withdraw.amount, 2)
+    if amount < 10:
+        raise HTTPException(status_code=400, detail="Minimum withdrawal amount is $10")
+    
+    withdrawal_id = f"wdr_{uuid.uuid4().hex[:12]}"
+    balance = await debit_wallet(user.user_id, amount, 'withdrawal', withdrawal_id)
+    if balance is None:
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+    
+    withdrawal_doc = {
+        'withdrawal_id': withdrawal_id,
+        'user_id': user.user_id,
+        'amount': amount,
+        'upi_id': withdraw.upi_id,
+        'bank_account': withdraw.bank_account,
+        'status': 'pending',
+        'created_at': datetime.now(timezone.utc)
+    }
+    try:
+        await db.withdrawals.insert_one(withdrawal_doc)
+    except Exception:
+        await credit_wallet(user.user_id, amount, 'withdrawal_reversal', withdrawal_id)
+        raise
+    
+    return {'message': 'Withdrawal request submitted', 'amount': amount, 'wallet_balance': balance}
+
+@api_router.post("/disputes", response_model=Dispute)
+async def create_dispute(dispute: DisputeCreate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Create a dispute for a transaction"""  
+    user = await get_current_user(authorization, session_token)
+    
+    transaction = await db.transactions.find_one({'transaction_id': dispute.transaction_id}, {'_id': 0})
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    if transaction['buyer_id'] != user.user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    dispute_id = f"dsp_{uuid.uuid4().hex[:12]}"
+    dispute_doc = {
+        'dispute_id': dispute_id,
+        'transaction_id': dispute.transaction_id,
+        'buyer_id': user.user_id,
+        'seller_id': transaction['seller_id'],
+        'coupon_id': transaction['coupon_id'],
+        'reason': dispute.reason,
+        'status': 'open',
+        'resolution': None,
+        'created_at': datetime.now(timezone.utc),
+        'resolved_at': None
+    }
+    
+    await db.disputes.insert_one(dispute_doc)
+    await record_analytics({'open_disputes': 1})
+    
+    await db.transactions.update_one(
+        {'transaction_id': dispute.transaction_id},
+        {'$set': {'status': 'disputed'}}
+    )
+    
+    return Dispute(**dispute_doc)
+
+@api_router.patch("/admin/coupons/{coupon_id}", response_model=Coupon)
+async def admin_update_coupon(coupon_id: str, update: CouponUpdate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin approve/reject coupons"""  
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    coupon = await db.coupons.find_one({'coupon_id': coupon_id}, {'_id': 0})
+    if not coupon:
+        raise HTTPException(status_code=404, detail="Coupon not found")
+    
+    coupon_update = {'$set': {'updated_at': datetime.now(timezone.utc)}}
+    if update.status:
+        live_update = live_fingerprint_update(update.status, coupon.get('code_fingerprint') or code_fingerprint_fields(coupon['coupon_code'])['code_fingerprint'])
+        coupon_update['$set'].update({'status': update.status, **live_update.get('$set', {})})
+        if '$unset' in live_update:
+            coupon_update['$unset'] = live_update['$unset']
+    
+    try:
+        await db.coupons.update_one({'coupon_id': coupon_id}, coupon_update)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Another live listing already has this coupon code")
+    if update.status:
+        await record_coupon_status_change(coupon['status'], update.status)
+    invalidate_coupon_responses(coupon_id)
+    
+    coupon = await db.coupons.find_one({'coupon_id': coupon_id}, {'_id': 0})
+    return Coupon(**coupon)
+
+@api_router.get("/admin/analytics")
+async def admin_analytics(days: int = 30, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin analytics dashboard data, read from the incrementally maintained rollups"""  
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    counters = await db.analytics_counters.find_one({'_id': 'global'}) or {}
+    
+    daily = []
+    days = max(0, min(days, 366))
+    if days:
+        since = analytics_day(datetime.now(timezone.utc) - timedelta(days=days - 1))
+        daily = await db.analytics_daily.find({'_id': {'$gte': since}}).sort('_id', ASCENDING).to_list(days)
+    
+    return {
+        'total_users': counters.get('total_users', 0),
+        'total_coupons': counters.get('total_coupons', 0),
+        'active_coupons': counters.get('coupons_approved', 0),
+        'sold_coupons': counters.get('coupons_sold', 0),
+        'total_transactions': counters.get('total_transactions', 0),
+        'total_sales': counters.get('total_sales', 0),
+        'fraud_attempts': counters.get('fraud_attempts', 0),
+        'open_disputes': counters.get('open_disputes', 0),
+        'daily': [
+            {
+                'date': doc['_id'],
+                'sales_count': doc.get('sales_count', 0),
+                'sales_amount': doc.get('sales_amount', 0),
+                'fraud_attempts': doc.get('fraud_attempts', 0)
+            }
+            for doc in daily
+        ]
+    }
 
-@api_router.get("/reviews/{coupon_id}\", response_model=List[Review])\nasync def get_coupon_reviews(coupon_id: str):\n    \"\"\"Get all reviews for a coupon\"\"\"  \n    reviews = await db.reviews.find({'coupon_id': coupon_id}, {'_id': 0}).to_list(100)\n    return [Review(**r) for r in reviews]
+@api_router.post("/admin/ratings/rebuild")
+async def admin_rebuild_ratings(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin rebuild seller and coupon rating aggregates from reviews"""
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return await rebuild_rating_aggregates()
+
+@api_router.post("/admin/analytics/reconcile")
+async def admin_reconcile_analytics(apply: bool = True, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin rebuild analytics rollups from source collections and report drift"""
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return await reconcile_analytics(apply=apply)
+
+@api_router.get("/admin/users", response_model=List[User])
+async def admin_get_users(
+    role: Optional[Literal['buyer', 'seller', 'admin']] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = ADMIN_MAX_PAGE_SIZE,
+    format: Literal['json', 'ndjson', 'csv'] = 'json',
+    authorization: Optional[str] = Header(None),
+    session_token: Optional[str] = Cookie(None)
+):
+    """Admin get users, newest first.
 
-@api_router.get("/wallet\")
-async def get_wallet(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Get user wallet balance\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    return {'wallet_balance': user.wallet_balance, 'user_id': user.user_id}
+    json returns one page with the next cursor in X-Next-Cursor; ndjson and
+    csv stream every matching user.
+    """
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    query = created_range(created_after, created_before)
+    if role:
+        query['role'] = role
+    
+    if format != 'json':
+        return stream_export(db.users, query, [('created_at', DESCENDING), ('user_id', DESCENDING)], list(User.model_fields), format, 'users')
+    
+    limit = max(1, min(limit, ADMIN_MAX_PAGE_SIZE))
+    users, next_cursor = await fetch_keyset_page(
+        db.users, query, 'users', 'created_at', DESCENDING, 'user_id', cursor, limit, projection=response_projection(User)
+    )
+    return json_rows_response(User, users, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
 
-@api_router.post("/wallet/withdraw\")
-async def withdraw_funds(withdraw: WithdrawRequest, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Request withdrawal (placeholder - manual process)\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    if withdraw.amount > user.wallet_balance:\n        raise HTTPException(status_code=400, detail=\"Insufficient balance\")\n    \n    if withdraw.amount < 10:\n        raise HTTPException(status_code=400, detail=\"Minimum withdrawal amount is $10\")\n    \n    await db.users.update_one(\n        {'user_id': user.user_id},\n        {'$inc': {'wallet_balance': -withdraw.amount}}\n    )\n    \n    withdrawal_doc = {\n        'withdrawal_id': f\"wdr_{uuid.uuid4().hex[:12]}\",\n        'user_id': user.user_id,\n        'amount': withdraw.amount,\n        'upi_id': withdraw.upi_id,\n        'bank_account': withdraw.bank_account,\n        'status': 'pending',\n        'created_at': datetime.now(timezone.utc)\n    }\n    await db.withdrawals.insert_one(withdrawal_doc)\n    \n    return {'message': 'Withdrawal request submitted', 'amount': withdraw.amount}
+@api_router.get("/admin/disputes", response_model=List[Dispute])
+async def admin_get_disputes(
+    status: Optional[Literal['open', 'investigating', 'resolved']] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = ADMIN_MAX_PAGE_SIZE,
+    format: Literal['json', 'ndjson', 'csv'] = 'json',
+    authorization: Optional[str] = Header(None),
+    session_token: Optional[str] = Cookie(None)
+):
+    """Admin get disputes, newest first.
 
-@api_router.post(\"/disputes\", response_model=Dispute)\nasync def create_dispute(dispute: DisputeCreate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Create a dispute for a transaction\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    transaction = await db.transactions.find_one({'transaction_id': dispute.transaction_id}, {'_id': 0})\n    if not transaction:\n        raise HTTPException(status_code=404, detail=\"Transaction not found\")\n    \n    if transaction['buyer_id'] != user.user_id:\n        raise HTTPException(status_code=403, detail=\"Access denied\")\n    \n    dispute_id = f\"dsp_{uuid.uuid4().hex[:12]}\"\n    dispute_doc = {\n        'dispute_id': dispute_id,\n        'transaction_id': dispute.transaction_id,\n        'buyer_id': user.user_id,\n        'seller_id': transaction['seller_id'],\n        'coupon_id': transaction['coupon_id'],\n        'reason': dispute.reason,\n        'status': 'open',\n        'resolution': None,\n        'created_at': datetime.now(timezone.utc),\n        'resolved_at': None\n    }\n    \n    await db.disputes.insert_one(dispute_doc)\n    \n    await db.transactions.update_one(\n        {'transaction_id': dispute.transaction_id},\n        {'$set': {'status': 'disputed'}}\n    )\n    \n    return Dispute(**dispute_doc)
+    json returns one page with the next cursor in X-Next-Cursor; ndjson and
+    csv stream every matching dispute.
+    """
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    query = created_range(created_after, created_before)
+    if status:
+        query['status'] = status
+    
+    if format != 'json':
+        return stream_export(db.disputes, query, [('created_at', DESCENDING), ('dispute_id', DESCENDING)], list(Dispute.model_fields), format, 'disputes')
+    
+    limit = max(1, min(limit, ADMIN_MAX_PAGE_SIZE))
+    disputes, next_cursor = await fetch_keyset_page(
+        db.disputes, query, 'disputes', 'created_at', DESCENDING, 'dispute_id', cursor, limit, projection=response_projection(Dispute)
+    )
+    return json_rows_response(Dispute, disputes, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
 
-@api_router.patch(\"/admin/coupons/{coupon_id}\", response_model=Coupon)\nasync def admin_update_coupon(coupon_id: str, update: CouponUpdate, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Admin approve/reject coupons\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    if user.role != 'admin':\n        raise HTTPException(status_code=403, detail=\"Admin access required\")\n    \n    coupon = await db.coupons.find_one({'coupon_id': coupon_id}, {'_id': 0})\n    if not coupon:\n        raise HTTPException(status_code=404, detail=\"Coupon not found\")\n    \n    update_data = {'updated_at': datetime.now(timezone.utc)}\n    if update.status:\n        update_data['status'] = update.status\n    \n    await db.coupons.update_one({'coupon_id': coupon_id}, {'$set': update_data})\n    \n    coupon = await db.coupons.find_one({'coupon_id': coupon_id}, {'_id': 0})\n    return Coupon(**coupon)
+@api_router.patch("/admin/disputes/{dispute_id}")
+async def admin_resolve_dispute(dispute_id: str, resolution: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin resolve dispute"""  
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    previous = await db.disputes.find_one_and_update(
+        {'dispute_id': dispute_id},
+        {'$set': {'status': 'resolved', 'resolution': resolution, 'resolved_at': datetime.now(timezone.utc)}},
+        projection={'status': 1}
+    )
+    if previous and previous['status'] == 'open':
+        await record_analytics({'open_disputes': -1})
+    
+    return {'message': 'Dispute resolved'}
 
-@api_router.get(\"/admin/analytics\")\nasync def admin_analytics(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Admin analytics dashboard data\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    if user.role != 'admin':\n        raise HTTPException(status_code=403, detail=\"Admin access required\")\n    \n    total_users = await db.users.count_documents({})\n    total_coupons = await db.coupons.count_documents({})\n    active_coupons = await db.coupons.count_documents({'status': 'approved'})\n    sold_coupons = await db.coupons.count_documents({'status': 'sold'})\n    total_transactions = await db.transactions.count_documents({})\n    \n    pipeline = [\n        {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}\n    ]\n    result = await db.transactions.aggregate(pipeline).to_list(1)\n    total_sales = result[0]['total'] if result else 0\n    \n    fraud_attempts = await db.ai_validation_logs.count_documents({'risk_score': 'high'})\n    open_disputes = await db.disputes.count_documents({'status': 'open'})\n    \n    return {\n        'total_users': total_users,\n        'total_coupons': total_coupons,\n        'active_coupons': active_coupons,\n        'sold_coupons': sold_coupons,\n        'total_transactions': total_transactions,\n        'total_sales': total_sales,\n        'fraud_attempts': fraud_attempts,\n        'open_disputes': open_disputes\n    }
+@api_router.get("/admin/withdrawals", response_model=List[Withdrawal])
+async def admin_get_withdrawals(
+    status: Optional[Literal['pending', 'paid', 'rejected']] = 'pending',
+    cursor: Optional[str] = None,
+    limit: int = ADMIN_MAX_PAGE_SIZE,
+    authorization: Optional[str] = Header(None),
+    session_token: Optional[str] = Cookie(None)
+):
+    """Admin get withdrawals, oldest first so pending ones are settled in request order"""
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    limit = max(1, min(limit, ADMIN_MAX_PAGE_SIZE))
+    withdrawals, next_cursor = await fetch_keyset_page(
+        db.withdrawals, {'status': status} if status else {}, 'withdrawals', 'created_at', ASCENDING, 'withdrawal_id', cursor, limit,
+        projection=response_projection(Withdrawal)
+    )
+    return json_rows_response(Withdrawal, withdrawals, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
 
-@api_router.get(\"/admin/users\", response_model=List[User])\nasync def admin_get_users(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Admin get all users\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    if user.role != 'admin':\n        raise HTTPException(status_code=403, detail=\"Admin access required\")\n    \n    users = await db.users.find({}, {'_id': 0}).to_list(1000)\n    return [User(**u) for u in users]
+@api_router.post("/admin/withdrawals/settle")
+async def admin_settle_withdrawals(settlement: WithdrawalSettlement, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin mark a batch of pending withdrawals paid, or reject them and refund the held amounts"""
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    withdrawal_ids = list(dict.fromkeys(settlement.withdrawal_ids))
+    if len(withdrawal_ids) > WALLET_SETTLE_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {WALLET_SETTLE_MAX_BATCH} withdrawals per settlement")
+    
+    return await settle_withdrawals(withdrawal_ids, settlement.status, user.user_id)
 
-@api_router.get(\"/admin/disputes\", response_model=List[Dispute])\nasync def admin_get_disputes(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Admin get all disputes\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    if user.role != 'admin':\n        raise HTTPException(status_code=403, detail=\"Admin access required\")\n    \n    disputes = await db.disputes.find({}, {'_id': 0}).to_list(1000)\n    return [Dispute(**d) for d in disputes]
+@api_router.get("/admin/wallet/drift")
+async def admin_wallet_drift(limit: int = 100, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin list users whose balance disagrees with their ledger"""
+    user = await get_current_user(authorization, session_token)
+    
+    if user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    drift = await wallet_drift(max(1, min(limit, ADMIN_MAX_PAGE_SIZE)))
+    return {'users': drift, 'count': len(drift)}
 
-@api_router.patch(\"/admin/disputes/{dispute_id}\")\nasync def admin_resolve_dispute(dispute_id: str, resolution: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Admin resolve dispute\"\"\"  \n    user = await get_current_user(authorization, session_token)\n    \n    if user.role != 'admin':\n        raise HTTPException(status_code=403, detail=\"Admin access required\")\n    \n    await db.disputes.update_one(\n        {'dispute_id': dispute_id},\n        {'$set': {'status': 'resolved', 'resolution': resolution, 'resolved_at': datetime.now(timezone.utc)}}\n    )\n    \n    return {'message': 'Dispute resolved'}
+@api_router.patch("/admin/users/{user_id}/role")
+async def admin_update_user_role(user_id: str, role: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Admin update user role"""  
+    admin = await get_current_user(authorization, session_token)
+    
+    if admin.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if role not in ['buyer', 'seller', 'admin']:
+        raise HTTPException(status_code=400, detail="Invalid role")
+    
+    await db.users.update_one(
+        {'user_id': user_id},
+        {'$set': {'role': role}}
+    )
+    session_cache.invalidate_user(user_id)
+    
+    return {'message': 'User role updated'}
 
-@api_router.patch(\"/admin/users/{user_id}/role\")\nasync def admin_update_user_role(user_id: str, role: str, authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):\n    \"\"\"Admin update user role\"\"\"  \n    admin = await get_current_user(authorization, session_token)\n    \n    if admin.role != 'admin':\n        raise HTTPException(status_code=403, detail=\"Admin access required\")\n    \n    if role not in ['buyer', 'seller', 'admin']:\n        raise HTTPException(status_code=400, detail=\"Invalid role\")\n    \n    await db.users.update_one(\n        {'user_id': user_id},\n        {'$set': {'role': role}}\n    )\n    \n    return {'message': 'User role updated'}
+@api_router.get("/metrics/validation")
+async def validation_metrics(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """AI validation queue depth and worker counters"""
+    await require_metrics_access(authorization, session_token)
+    queued = await db.validation_jobs.count_documents({'status': 'queued'})
+    running = await db.validation_jobs.count_documents({'status': 'running'})
+    return {
+        'queued': queued,
+        'running': running,
+        **validation_workers.stats(),
+        'prescreen': coupon_prescreen.stats(),
+        'result_cache': validation_result_cache.stats()
+    }
+
+@api_router.get("/metrics/outbound")
+async def outbound_metrics(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Latency histograms per outbound dependency"""
+    await require_metrics_access(authorization, session_token)
+    return {name: histogram.snapshot() for name, histogram in outbound_latency.items()}
+
+@api_router.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def prometheus_metrics(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """Request, Mongo and outbound metrics in Prometheus text exposition format"""
+    await require_metrics_access(authorization, session_token)
+    return PlainTextResponse(render_prometheus_metrics(), media_type='text/plain; version=0.0.4')
+
+@api_router.get("/metrics/cache")
+async def cache_metrics(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
+    """In-process cache counters for scraping"""
+    await require_metrics_access(authorization, session_token)
+    return {'session': session_cache.stats(), 'responses': response_cache.stats()}
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.statuses = {}
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.outbound_seconds = {}
+        self.response_bytes = 0
+
+route_metrics = {}
+
+def record_request(method: str, route: str, status: int, response_bytes: int, metrics: RequestMetrics):
+    elapsed = time.perf_counter() - metrics.started
+    stats = route_metrics.get((method, route))
+    if stats is None:
+        stats = route_metrics[(method, route)] = RouteMetrics()
+    stats.latency.observe(elapsed, error=status >= 500)
+    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+    stats.db_calls += metrics.db_calls
+    stats.db_seconds += metrics.db_seconds
+    stats.response_bytes += response_bytes
+    for dependency, seconds in metrics.outbound_seconds.items():
+        stats.outbound_seconds[dependency] = stats.outbound_seconds.get(dependency, 0.0) + seconds
+    
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        outbound_ms = {dep: round(seconds * 1000) for dep, seconds in metrics.outbound_seconds.items()}
+        # concurrent DB/outbound calls overlap, so their sums can exceed wall time
+        other_ms = max(0.0, elapsed - metrics.db_seconds - sum(metrics.outbound_seconds.values())) * 1000
+        shapes = sorted(metrics.query_shapes.items(), key=lambda item: -item[1])
+        logger.warning(
+            f"Slow request {method} {route} -> {status} in {elapsed * 1000:.0f}ms: "
+            f"db {metrics.db_calls} calls/{metrics.db_seconds * 1000:.0f}ms, outbound {outbound_ms}, "
+            f"other {other_ms:.0f}ms, {response_bytes} bytes"
+            + ''.join(f"\n    {count}x {shape}" for shape, count in shapes)
+        )
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware so streamed bodies are counted and no extra task is spawned per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        status = 500
+        response_bytes = 0
+        
+        async def send_and_count(message):
+            nonlocal status, response_bytes
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                response_bytes += len(message.get('body', b''))
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_and_count)
+        finally:
+            current_request_metrics.reset(token)
+            route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+            record_request(scope['method'], route, status, response_bytes, metrics)
+
+def prometheus_labels(labels: dict) -> str:
+    escaped = {key: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for key, value in labels.items()}
+    return ','.join(f'{key}="{value}"' for key, value in escaped.items())
+
+def prometheus_histogram(lines: list, name: str, labels: dict, histogram: LatencyHistogram):
+    for bound, running in histogram.cumulative():
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f"{name}_bucket{{{prometheus_labels({**labels, 'le': le})}}} {running}")
+    lines.append(f"{name}_sum{{{prometheus_labels(labels)}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{prometheus_labels(labels)}}} {histogram.count}")
+
+def render_prometheus_metrics() -> str:
+    lines = []
+    routes = sorted(route_metrics.items())
+    
+    lines += ['# HELP http_request_duration_seconds Wall time per request by route',
+              '# TYPE http_request_duration_seconds histogram']
+    for (method, route), stats in routes:
+        prometheus_histogram(lines, 'http_request_duration_seconds', {'method': method, 'route': route}, stats.latency)
+    
+    lines += ['# HELP http_requests_total Requests by route and status', '# TYPE http_requests_total counter']
+    for (method, route), stats in routes:
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(f"http_requests_total{{{prometheus_labels({'method': method, 'route': route, 'status': status})}}} {count}")
+    
+    for name, help_text, value in (
+        ('http_request_db_calls_total', 'Mongo round trips made while serving the route', lambda stats: stats.db_calls),
+        ('http_request_db_seconds_total', 'Time spent in Mongo commands while serving the route', lambda stats: stats.db_seconds),
+        ('http_response_size_bytes_total', 'Response body bytes sent by the route', lambda stats: stats.response_bytes),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (method, route), stats in routes:
+            lines.append(f"{name}{{{prometheus_labels({'method': method, 'route': route})}}} {value(stats)}")
+    
+    lines += ['# HELP http_request_outbound_seconds_total Time spent waiting on each outbound dependency by route',
+              '# TYPE http_request_outbound_seconds_total counter']
+    for (method, route), stats in routes:
+        for dependency, seconds in sorted(stats.outbound_seconds.items()):
+            lines.append(f"http_request_outbound_seconds_total{{{prometheus_labels({'method': method, 'route': route, 'dependency': dependency})}}} {seconds}")
+    
+    lines += ['# HELP mongo_command_duration_seconds Mongo command latency by command name',
+              '# TYPE mongo_command_duration_seconds histogram']
+    for command_name, histogram in mongo_command_listener.histograms():
+        prometheus_histogram(lines, 'mongo_command_duration_seconds', {'command': command_name}, histogram)
+    
+    lines += ['# HELP outbound_request_duration_seconds Outbound call latency by dependency',
+              '# TYPE outbound_request_duration_seconds histogram']
+    for dependency, histogram in sorted(outbound_latency.items()):
+        prometheus_histogram(lines, 'outbound_request_duration_seconds', {'dependency': dependency}, histogram)
+    
+    return '\n'.join(lines) + '\n'
 
 app.include_router(api_router)
 
-app.add_middleware(\n    CORSMiddleware,\n    allow_credentials=True,\n    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),\n    allow_methods=[\"*\"],\n    allow_headers=[\"*\"],\n)
+app.add_middleware(
+    CORSMiddleware,
+    allow_credentials=True,
+    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+app.add_middleware(RequestMetricsMiddleware)
+
+# Indexes backing every query shape issued by the routes above.
+INDEX_SPECS = {
+    'users': [
+        IndexModel([('user_id', ASCENDING)], unique=True),
+        IndexModel([('email', ASCENDING)]),
+        IndexModel([('created_at', DESCENDING), ('user_id', DESCENDING)]),
+        IndexModel([('role', ASCENDING), ('created_at', DESCENDING), ('user_id', DESCENDING)]),
+    ],
+    'user_sessions': [
+        IndexModel([('session_token', ASCENDING)], unique=True),
+        IndexModel([('user_id', ASCENDING)]),
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'coupons': [
+        IndexModel([('coupon_id', ASCENDING)], unique=True),
+        IndexModel([('seller_id', ASCENDING)]),
+        IndexModel([('code_fingerprint', ASCENDING), ('status', ASCENDING)]),
+        IndexModel([('live_fingerprint', ASCENDING)], unique=True, sparse=True),
+        IndexModel([('brand_key', ASCENDING), ('code_prefix', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('asking_price', ASCENDING), ('coupon_id', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('coupon_id', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('discount_ratio', DESCENDING), ('coupon_id', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('brand_key', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('expires_at', ASCENDING), ('coupon_id', ASCENDING)]),
+        IndexModel([('brand_name', TEXT)], name='coupon_text', default_language='none'),
+    ],
+    'transactions': [
+        IndexModel([('transaction_id', ASCENDING)], unique=True),
+        IndexModel([('buyer_id', ASCENDING)]),
+        IndexModel([('seller_id', ASCENDING)]),
+        IndexModel([('coupon_id', ASCENDING), ('buyer_id', ASCENDING)]),
+        IndexModel([('session_id', ASCENDING)], unique=True, partialFilterExpression={'session_id': {'$type': 'string'}}),
+        IndexModel([('completed_at', ASCENDING)], name='payout_pending', partialFilterExpression={'payout_pending': True}),
+    ],
+    'payment_transactions': [
+        IndexModel([('session_id', ASCENDING)], unique=True),
+        IndexModel([('user_id', ASCENDING)]),
+    ],
+    'reviews': [
+        IndexModel([('coupon_id', ASCENDING)]),
+        IndexModel([('seller_id', ASCENDING)]),
+    ],
+    'disputes': [
+        IndexModel([('dispute_id', ASCENDING)], unique=True),
+        IndexModel([('transaction_id', ASCENDING)]),
+        IndexModel([('created_at', DESCENDING), ('dispute_id', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('dispute_id', DESCENDING)]),
+    ],
+    'ai_validation_logs': [
+        IndexModel([('coupon_id', ASCENDING)]),
+        IndexModel([('risk_score', ASCENDING)]),
+    ],
+    'validation_jobs': [
+        IndexModel([('job_id', ASCENDING)], unique=True),
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('locked_at', ASCENDING)]),
+    ],
+    'llm_validation_cache': [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'withdrawals': [
+        IndexModel([('withdrawal_id', ASCENDING)], unique=True),
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING), ('withdrawal_id', ASCENDING)]),
+        IndexModel([('settlement_id', ASCENDING)], sparse=True),
+        IndexModel([('settled_at', ASCENDING)], name='refund_pending', partialFilterExpression={'refund_pending': True}),
+    ],
+    'wallet_ledger': [
+        IndexModel([('entry_id', ASCENDING)], unique=True),
+        IndexModel([('kind', ASCENDING), ('ref_id', ASCENDING)], unique=True),
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING), ('entry_id', DESCENDING)]),
+        IndexModel([('state', ASCENDING), ('created_at', ASCENDING)]),
+    ],
+}
+
+# Representative filters for the hot paths; each must be answered by an index.
+EXPIRY_BACKFILL_QUERY = {'status': {'$in': COUPON_STATUSES}, 'expires_at': None, 'expires_at_unparsed': {'$exists': False}}
+
+HOT_QUERY_SHAPES = [
+    ('user_sessions', {'session_token': 'x'}),
+    ('users', {'user_id': 'x'}),
+    ('users', {'email': 'x'}),
+    ('coupons', {'coupon_id': 'x'}),
+    ('coupons', {'seller_id': 'x'}),
+    ('coupons', {'code_fingerprint': 'x', 'status': {'$in': LIVE_COUPON_STATUSES}}),
+    ('coupons', {'brand_key': 'x', 'code_prefix': 'x'}),
+    ('coupons', {'status': 'approved', 'asking_price': {'$gte': 0, '$lte': 100}}),
+    ('coupons', {'status': 'approved', 'brand_key': {'$regex': '^x'}}),
+    ('coupons', {'status': 'approved', 'expires_at': {'$lte': datetime(2000, 1, 1, tzinfo=timezone.utc)}}),
+    ('coupons', EXPIRY_BACKFILL_QUERY),
+    ('transactions', {'transaction_id': 'x'}),
+    ('transactions', {'$or': [{'buyer_id': 'x'}, {'seller_id': 'x'}]}),
+    ('transactions', {'coupon_id': 'x', 'buyer_id': 'x'}),
+    ('payment_transactions', {'session_id': 'x'}),
+    ('reviews', {'coupon_id': 'x'}),
+    ('disputes', {'status': 'open'}),
+    ('ai_validation_logs', {'risk_score': 'high'}),
+    ('withdrawals', {'status': 'pending'}),
+    ('wallet_ledger', {'user_id': 'x'}),
+    ('wallet_ledger', {'state': 'pending'}),
+]
+
+async def backfill_coupon_fields():
+    """One-off fill of brand_key/discount_ratio for coupons listed before they existed"""
+    result = await db.coupons.update_many(
+        {'brand_key': {'$exists': False}},
+        [{'$set': {
+            'brand_key': {'$toLower': {'$trim': {'input': '$brand_name'}}},
+            'discount_ratio': {'$cond': [
+                {'$gt': ['$asking_price', 0]},
+                {'$divide': ['$coupon_value', '$asking_price']},
+                0.0
+            ]}
+        }}]
+    )
+    if result.modified_count:
+        logger.info(f"Backfilled listing fields on {result.modified_count} coupons")
+
+async def backfill_code_fingerprints(batch_size: int = 1000):
+    """Fill code_fingerprint/code_prefix/masked_code on coupons created before those fields existed"""
+    total = 0
+    while True:
+        batch = await db.coupons.find(
+            {'$or': [{'code_fingerprint': {'$exists': False}}, {'masked_code': {'$exists': False}}]},
+            {'_id': 0, 'coupon_id': 1, 'coupon_code': 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        await db.coupons.bulk_write(
+            [UpdateOne({'coupon_id': c['coupon_id']}, {'$set': code_fingerprint_fields(c['coupon_code'])}) for c in batch],
+            ordered=False
+        )
+        total += len(batch)
+    if total:
+        logger.info(f"Backfilled code-derived fields on {total} coupons")
+
+async def backfill_live_fingerprints(batch_size: int = 1000):
+    """Claim live_fingerprint for live coupons listed before it existed; the older listing of a duplicated code keeps it"""
+    cursor = db.coupons.find(
+        {'status': {'$in': LIVE_COUPON_STATUSES}, 'live_fingerprint': {'$exists': False}, 'code_fingerprint': {'$exists': True}},
+        {'_id': 0, 'coupon_id': 1, 'code_fingerprint': 1}
+    ).sort('created_at', ASCENDING).batch_size(batch_size)
+    claimed = conflicts = 0
+    batch = []
+    async for coupon in cursor:
+        batch.append(UpdateOne({'coupon_id': coupon['coupon_id']}, {'$set': {'live_fingerprint': coupon['code_fingerprint']}}))
+        if len(batch) >= batch_size:
+            failed = await _claim_live_fingerprints(batch)
+            claimed, conflicts, batch = claimed + len(batch) - failed, conflicts + failed, []
+    if batch:
+        failed = await _claim_live_fingerprints(batch)
+        claimed, conflicts = claimed + len(batch) - failed, conflicts + failed
+    if claimed or conflicts:
+        logger.info(f"Backfilled live_fingerprint on {claimed} coupons; {conflicts} live duplicates left without it")
+
+async def _claim_live_fingerprints(batch: list) -> int:
+    try:
+        await db.coupons.bulk_write(batch, ordered=False)
+    except BulkWriteError as e:
+        return len(e.details.get('writeErrors', []))
+    return 0
+
+async def backfill_expiry_dates(batch_size: int = 1000):
+    """Parse expiry_date into expires_at on coupons that have none.
+
+    Rows whose expiry_date still doesn't parse are marked expires_at_unparsed
+    so later startups skip them; the status prefix keeps the lookup on the
+    (status, expires_at) index.
+    """
+    parsed = 0
+    while True:
+        batch = await db.coupons.find(EXPIRY_BACKFILL_QUERY, {'_id': 0, 'coupon_id': 1, 'expiry_date': 1}).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        updates = []
+        for c in batch:
+            expires_at = coupon_expires_at(c.get('expiry_date') or '')
+            fields = {'expires_at': expires_at} if expires_at else {'expires_at': None, 'expires_at_unparsed': True}
+            updates.append(UpdateOne({'coupon_id': c['coupon_id']}, {'$set': fields}))
+            parsed += expires_at is not None
+        await db.coupons.bulk_write(updates, ordered=False)
+    if parsed:
+        logger.info(f"Backfilled expires_at on {parsed} coupons")
+
+async def ensure_indexes():
+    for collection_name, indexes in INDEX_SPECS.items():
+        await db[collection_name].create_indexes(indexes)
+    logger.info(f"Ensured indexes on {len(INDEX_SPECS)} collections")
+
+def _plan_stages(plan: dict):
+    yield plan.get('stage')
+    for key in ('inputStage', 'queryPlan'):
+        if isinstance(plan.get(key), dict):
+            yield from _plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+
+async def verify_query_plans():
+    """Explain every hot query shape and fail if any falls back to a COLLSCAN"""
+    offenders = []
+    for collection_name, query in HOT_QUERY_SHAPES:
+        explanation = await db[collection_name].find(query).explain()
+        winning_plan = explanation.get('queryPlanner', {}).get('winningPlan', {})
+        if 'COLLSCAN' in _plan_stages(winning_plan):
+            offenders.append(f"{collection_name} {query}")
+    
+    if offenders:
+        raise RuntimeError(f"Query plan self-check failed, COLLSCAN on: {'; '.join(offenders)}")
+    logger.info(f"Query plan self-check passed for {len(HOT_QUERY_SHAPES)} query shapes")
+
+@app.on_event("startup")
+async def startup_db_indexes():
+    await ensure_indexes()
+    await backfill_coupon_fields()
+    await backfill_code_fingerprints()
+    await backfill_live_fingerprints()
+    await backfill_expiry_dates()
+    await ensure_wallet_ledger()
+    if DB_INDEX_SELF_CHECK:
+        await verify_query_plans()
+
+@app.on_event("startup")
+async def start_analytics_rollups():
+    await ensure_analytics_rollups()
+    analytics_reconciler.start()
+
+@app.on_event("startup")
+async def start_rating_reconciler():
+    rating_reconciler.start()
+
+@app.on_event("startup")
+async def start_expiry_sweeper():
+    coupon_expiry_sweeper.start()
+
+@app.on_event("startup")
+async def start_wallet_recovery():
+    wallet_recovery.start()
+
+@app.on_event("startup")
+async def start_validation_workers():
+    validation_workers.start()
+
+@app.on_event("startup")
+async def open_outbound_clients():
+    outbound.open()
 
-@app.on_event(\"shutdown\")\nasync def shutdown_db_client():\n    client.close()
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    await validation_workers.stop()
+    await analytics_reconciler.stop()
+    await coupon_expiry_sweeper.stop()
+    await rating_reconciler.stop()
+    await wallet_recovery.stop()
+    await outbound.close()
+    client.close()
@@ -0,0 +1,434 @@
+"""Load-test and latency benchmark for backend/server.py against local stand-ins.
+
+Boots the FastAPI app in-process over an ASGI transport, seeds a configurable
+data volume and drives a weighted mix of browse, search, login, checkout
+poll, listing creation and admin analytics traffic from concurrent virtual
+users. Throughput and p50/p95/p99 latency per endpoint are written as JSON
+so runs can be diffed against each other.
+
+Nothing leaves the machine: the LLM validator runs with LLM_PROVIDER=fake,
+Stripe is replaced by FakeStripeCheckout and the auth provider is answered
+by an httpx MockTransport. Mongo is a local mongod when --mongo-url is
+given, otherwise the in-memory mongomock-motor stand-in (which has no
+$text support, so search then runs without a query term).
+
+    python -m tests.benchmark --duration 30 --concurrency 32 --out bench.json
+    python -m tests.benchmark --mongo-url mongodb://localhost:27017 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+DEFAULT_MIX = {
+    'browse': 45,
+    'detail': 15,
+    'search': 10,
+    'login': 10,
+    'checkout_poll': 10,
+    'create_listing': 5,
+    'admin_analytics': 5,
+}
+
+BRANDS = ['Amazon', 'Nike', 'Uber Eats', 'Starbucks', 'Target', 'Sephora', 'Apple', 'Walmart', 'Airbnb', 'Spotify']
+SORTS = ['newest', 'price_asc', 'price_desc', 'discount']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--mongo-url', help='Local mongod to benchmark against; defaults to in-memory mongomock-motor')
+    parser.add_argument('--db-name', default=f"bench_{uuid.uuid4().hex[:8]}")
+    parser.add_argument('--keep-db', action='store_true', help='Do not drop the benchmark database afterwards')
+    parser.add_argument('--coupons', type=int, default=2000)
+    parser.add_argument('--buyers', type=int, default=200)
+    parser.add_argument('--sellers', type=int, default=50)
+    parser.add_argument('--payments', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of traffic excluded from results')
+    parser.add_argument('--mix', default=None, help='Scenario weights, e.g. browse=60,login=10 (default: %s)' % ','.join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument('--llm-latency-ms', type=int, default=200)
+    parser.add_argument('--stripe-latency-ms', type=int, default=80)
+    parser.add_argument('--auth-latency-ms', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', default='benchmark.json')
+    parser.add_argument('--compare', help='Earlier result file to diff against')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='Exit non-zero if any endpoint p95 grows by more than this percent versus --compare')
+    return parser.parse_args(argv)
+
+
+def parse_mix(spec):
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def load_server(args):
+    """Import backend/server.py configured for local stand-ins"""
+    os.environ['MONGO_URL'] = args.mongo_url or 'mongodb://localhost:27017'
+    os.environ['DB_NAME'] = args.db_name
+    os.environ['LLM_PROVIDER'] = 'fake'
+    os.environ['FAKE_LLM_LATENCY_MS'] = str(args.llm_latency_ms)
+    os.environ.setdefault('ANALYTICS_RECONCILE_INTERVAL', '0')
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    if not args.mongo_url:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("Install mongomock-motor or pass --mongo-url to benchmark against a local mongod")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db_name]
+    return server
+
+
+class FakeStripeCheckout:
+    """Stand-in for StripeCheckout; sessions stay unpaid so polling keeps exercising the Stripe round trip"""
+    latency = 0.0
+
+    def __init__(self, api_key=None, webhook_url=None):
+        self.webhook_url = webhook_url
+
+    async def create_checkout_session(self, checkout_request):
+        from emergentintegrations.payments.stripe.checkout import CheckoutSessionResponse
+        await asyncio.sleep(self.latency)
+        session_id = f"cs_bench_{uuid.uuid4().hex[:16]}"
+        return CheckoutSessionResponse(url=f"https://checkout.stripe.test/{session_id}", session_id=session_id)
+
+    async def get_checkout_status(self, session_id):
+        from emergentintegrations.payments.stripe.checkout import CheckoutStatusResponse
+        await asyncio.sleep(self.latency)
+        return CheckoutStatusResponse(status='open', payment_status='unpaid', amount_total=0, currency='usd', metadata={})
+
+
+def fake_auth_transport(latency):
+    """MockTransport answering the auth provider's session-data call with a stable identity per session id"""
+    async def handler(request):
+        await asyncio.sleep(latency)
+        session_id = request.headers.get('X-Session-ID', '')
+        email_user = session_id.rsplit('-', 1)[0] or 'anon'
+        return httpx.Response(200, json={
+            'id': session_id,
+            'email': f"{email_user}@bench.example.com",
+            'name': email_user,
+            'picture': None,
+            'session_token': f"session_{uuid.uuid4().hex}"
+        })
+    return httpx.MockTransport(handler)
+
+
+async def seed(server, args, rng):
+    """Insert users, sessions, approved coupons and pending payments; returns the ids the scenarios need"""
+    now = datetime.now(timezone.utc)
+
+    def user_docs(prefix, count, role):
+        users, sessions = [], []
+        for i in range(count):
+            user_id = f"{prefix}_{i:05d}"
+            users.append({'user_id': user_id, 'email': f"{user_id}@bench.example.com", 'name': user_id, 'role': role,
+                          'wallet_balance': 0.0, 'created_at': now - timedelta(minutes=i)})
+            sessions.append({'user_id': user_id, 'session_token': f"tok_{user_id}", 'expires_at': now + timedelta(days=7), 'created_at': now})
+        return users, sessions
+
+    ids = {}
+    for prefix, count, role in (('buyer', args.buyers, 'buyer'), ('seller', args.sellers, 'seller'), ('admin', 1, 'admin')):
+        users, sessions = user_docs(prefix, count, role)
+        await server.db.users.insert_many(users)
+        await server.db.user_sessions.insert_many(sessions)
+        ids[role] = [u['user_id'] for u in users]
+
+    verdict = {'risk_score': 'low', 'feedback': 'Seeded for benchmark', 'issues': [], 'recommendation': 'approve'}
+    coupon_ids = []
+    batch = []
+    for i in range(args.coupons):
+        value = rng.choice([10, 20, 25, 50, 75, 100, 150, 250])
+        coupon = server.CouponCreate(
+            brand_name=rng.choice(BRANDS),
+            coupon_code=f"BENCH{i:08d}",
+            expiry_date=(now + timedelta(days=rng.randint(10, 400))).strftime('%Y-%m-%d'),
+            coupon_value=value,
+            asking_price=round(value * rng.uniform(0.4, 0.95), 2)
+        )
+        doc = server.coupon_listing_doc(f"cpn_bench{i:07d}", rng.choice(ids['seller']), coupon, verdict)
+        doc['created_at'] = doc['updated_at'] = now - timedelta(seconds=i)
+        batch.append(doc)
+        coupon_ids.append(doc['coupon_id'])
+        if len(batch) >= 1000:
+            await server.db.coupons.insert_many(batch)
+            batch = []
+    if batch:
+        await server.db.coupons.insert_many(batch)
+
+    payments = []
+    for i in range(args.payments):
+        payments.append({
+            'payment_id': f"pmt_bench{i:07d}",
+            'user_id': rng.choice(ids['buyer']),
+            'coupon_id': rng.choice(coupon_ids),
+            'seller_id': rng.choice(ids['seller']),
+            'session_id': f"cs_seed_{i:07d}",
+            'amount': 10.0,
+            'currency': 'usd',
+            'payment_status': 'pending',
+            'created_at': now
+        })
+    if payments:
+        await server.db.payment_transactions.insert_many(payments)
+
+    ids['coupon'] = coupon_ids
+    ids['payment'] = [(p['session_id'], p['user_id']) for p in payments]
+    return ids
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.recording = False
+
+    def add(self, endpoint, elapsed, ok):
+        if not self.recording:
+            return
+        self.samples.setdefault(endpoint, []).append(elapsed)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class Scenarios:
+    """One coroutine per traffic type; each issues its requests and records them under a route label"""
+
+    def __init__(self, client, transport, ids, recorder, rng, text_search):
+        self.client = client
+        self.transport = transport
+        self.ids = ids
+        self.recorder = recorder
+        self.rng = rng
+        self.text_search = text_search
+        self.listings = 0
+
+    async def call(self, endpoint, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 500
+        except Exception:
+            response, ok = None, False
+        self.recorder.add(endpoint, time.perf_counter() - started, ok)
+        return response
+
+    def auth(self, role):
+        return {'Authorization': f"Bearer tok_{self.rng.choice(self.ids[role])}"}
+
+    async def browse(self):
+        params = {'sort': self.rng.choice(SORTS), 'limit': 24}
+        if self.rng.random() < 0.3:
+            params['brand'] = self.rng.choice(BRANDS)
+        response = await self.call('GET /api/coupons', 'GET', '/api/coupons', params=params)
+        next_cursor = response.headers.get('X-Next-Cursor') if response is not None else None
+        if next_cursor and self.rng.random() < 0.5:
+            await self.call('GET /api/coupons', 'GET', '/api/coupons', params={**params, 'cursor': next_cursor})
+
+    async def detail(self):
+        coupon_id = self.rng.choice(self.ids['coupon'])
+        await self.call('GET /api/coupons/{coupon_id}', 'GET', f"/api/coupons/{coupon_id}")
+        await self.call('GET /api/reviews/{coupon_id}', 'GET', f"/api/reviews/{coupon_id}")
+
+    async def search(self):
+        params = {'limit': 20}
+        if self.text_search:
+            params['q'] = self.rng.choice(BRANDS).split()[0]
+        if self.rng.random() < 0.3:
+            params['min_discount'] = self.rng.choice([10, 25, 50])
+        await self.call('GET /api/coupons/search', 'GET', '/api/coupons/search', params=params)
+
+    async def login(self):
+        # A fresh client per login keeps the session cookie out of the shared client
+        async with httpx.AsyncClient(transport=self.transport, base_url=str(self.client.base_url)) as login_client:
+            session_id = f"bench-login-{self.rng.randrange(max(1, len(self.ids['buyer'])))}-{uuid.uuid4().hex[:6]}"
+            started = time.perf_counter()
+            try:
+                response = await login_client.post('/api/auth/session', json={'session_id': session_id})
+                ok = response.status_code < 500
+            except Exception:
+                response, ok = None, False
+            self.recorder.add('POST /api/auth/session', time.perf_counter() - started, ok)
+            if response is not None and response.status_code == 200:
+                token = response.cookies.get('session_token')
+                if token:
+                    await self.call('GET /api/auth/me', 'GET', '/api/auth/me', headers={'Authorization': f"Bearer {token}"})
+
+    async def checkout_poll(self):
+        session_id, user_id = self.rng.choice(self.ids['payment'])
+        await self.call('GET /api/checkout/status/{session_id}', 'GET', f"/api/checkout/status/{session_id}",
+                        headers={'Authorization': f"Bearer tok_{user_id}"})
+
+    async def create_listing(self):
+        self.listings += 1
+        value = self.rng.choice([20, 50, 100])
+        payload = {
+            'brand_name': self.rng.choice(BRANDS),
+            'coupon_code': f"NEW{uuid.uuid4().hex[:12].upper()}",
+            'expiry_date': (datetime.now(timezone.utc) + timedelta(days=90)).strftime('%Y-%m-%d'),
+            'coupon_value': value,
+            'asking_price': round(value * self.rng.uniform(0.5, 0.9), 2)
+        }
+        await self.call('POST /api/coupons', 'POST', '/api/coupons', json=payload, headers=self.auth('seller'))
+
+    async def admin_analytics(self):
+        await self.call('GET /api/admin/analytics', 'GET', '/api/admin/analytics', headers=self.auth('admin'))
+
+
+async def drive(scenarios, mix, rng, concurrency, warmup, duration, recorder):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    stop_at = time.perf_counter() + warmup + duration
+
+    async def user():
+        while time.perf_counter() < stop_at:
+            await getattr(scenarios, rng.choices(names, weights)[0])()
+
+    async def start_recording():
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+
+    await asyncio.gather(start_recording(), *(user() for _ in range(concurrency)))
+
+
+def summarize(recorder, duration):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        endpoints[endpoint] = {
+            'count': len(ordered),
+            'errors': recorder.errors.get(endpoint, 0),
+            'throughput_rps': round(len(ordered) / duration, 2),
+            'mean_ms': round(1000 * sum(ordered) / len(ordered), 3),
+            'p50_ms': round(1000 * percentile(ordered, 50), 3),
+            'p95_ms': round(1000 * percentile(ordered, 95), 3),
+            'p99_ms': round(1000 * percentile(ordered, 99), 3),
+            'max_ms': round(1000 * ordered[-1], 3)
+        }
+    total = sum(e['count'] for e in endpoints.values())
+    return {
+        'requests': total,
+        'errors': sum(e['errors'] for e in endpoints.values()),
+        'throughput_rps': round(total / duration, 2)
+    }, endpoints
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(result, baseline_path, max_regression):
+    """Print p95/p99 deltas versus a previous run; returns the endpoints over max_regression"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressions = []
+    print(f"\nversus {baseline_path} ({baseline['meta'].get('git_revision')}):")
+    for endpoint, stats in result['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint)
+        if not before or not before['p95_ms']:
+            continue
+        change = 100 * (stats['p95_ms'] - before['p95_ms']) / before['p95_ms']
+        print(f"  {endpoint:45s} p95 {before['p95_ms']:9.2f} -> {stats['p95_ms']:9.2f} ms ({change:+.1f}%)")
+        if max_regression is not None and change > max_regression:
+            regressions.append(endpoint)
+    return regressions
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    server = load_server(args)
+
+    FakeStripeCheckout.latency = args.stripe_latency_ms / 1000
+    server.outbound.stripe_factory = FakeStripeCheckout
+    server.outbound.open(transport=fake_auth_transport(args.auth_latency_ms / 1000))
+
+    seed_started = time.perf_counter()
+    ids = await seed(server, args, rng)
+    seed_seconds = time.perf_counter() - seed_started
+
+    for handler in server.app.router.on_startup:
+        await handler()
+
+    transport = httpx.ASGITransport(app=server.app)
+    recorder = Recorder()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+            scenarios = Scenarios(client, transport, ids, recorder, rng, text_search=bool(args.mongo_url))
+            await drive(scenarios, mix, rng, args.concurrency, args.warmup, args.duration, recorder)
+    finally:
+        for handler in server.app.router.on_shutdown:
+            if handler.__name__ == 'shutdown_db_client' and args.mongo_url and not args.keep_db:
+                await server.client.drop_database(args.db_name)
+            await handler()
+
+    totals, endpoints = summarize(recorder, args.duration)
+    return {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'mongo': 'mongod' if args.mongo_url else 'mongomock',
+            'seed_seconds': round(seed_seconds, 2),
+            'config': {k: v for k, v in vars(args).items() if k not in ('out', 'compare', 'max_regression')},
+            'mix': mix
+        },
+        'totals': totals,
+        'endpoints': endpoints
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    Path(args.out).write_text(json.dumps(result, indent=2))
+
+    print(f"{result['totals']['requests']} requests, {result['totals']['errors']} errors, {result['totals']['throughput_rps']} req/s -> {args.out}")
+    print(f"  {'endpoint':45s} {'count':>7s} {'errors':>7s} {'rps':>8s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for endpoint, stats in result['endpoints'].items():
+        print(f"  {endpoint:45s} {stats['count']:7d} {stats['errors']:7d} {stats['throughput_rps']:8.1f} "
+              f"{stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f}")
+
+    if args.compare:
+        regressions = compare(result, args.compare, args.max_regression)
+        if regressions:
+            print(f"p95 regressed by more than {args.max_regression}% on: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Shared fixtures: backend/server.py booted against in-memory Mongo with the fake LLM validator.
+
+Background validation workers are off (VALIDATION_WORKERS=0) so each test
+drives the queue itself; Stripe is replaced per test through outbound.stripe_factory.
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test')
+os.environ['LLM_PROVIDER'] = 'fake'
+os.environ['VALIDATION_WORKERS'] = '0'
+os.environ['ANALYTICS_RECONCILE_INTERVAL'] = '0'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import server  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def app(monkeypatch):
+    """The app with startup hooks run against a fresh database; shutdown hooks run afterwards"""
+    mongo = AsyncMongoMockClient()
+    monkeypatch.setattr(server, 'client', mongo)
+    monkeypatch.setattr(server, 'db', mongo[f"test_{uuid.uuid4().hex[:8]}"])
+    monkeypatch.setattr(server, 'validation_result_cache', server.ValidationResultCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(server.outbound, 'stripe_factory', server.outbound.stripe_factory)
+    server.session_cache.clear()
+    server.response_cache.clear()
+
+    for handler in server.app.router.on_startup:
+        await handler()
+    try:
+        yield server.app
+    finally:
+        for handler in server.app.router.on_shutdown:
+            await handler()
+
+
+@pytest.fixture
+async def api(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        yield client
+
+
+async def seed_user(user_id: str, role: str = 'buyer', wallet_balance: float = 0.0) -> dict:
+    """Insert a user with a session; returns the Authorization header for it"""
+    now = datetime.now(timezone.utc)
+    await server.db.users.insert_one({
+        'user_id': user_id, 'email': f"{user_id}@test.example.com", 'name': user_id, 'role': role,
+        'wallet_balance': wallet_balance, 'created_at': now
+    })
+    await server.db.user_sessions.insert_one({
+        'user_id': user_id, 'session_token': f"tok_{user_id}", 'expires_at': now + timedelta(days=1), 'created_at': now
+    })
+    if wallet_balance:
+        await server.db.wallet_ledger.insert_one(server.ledger_entry_doc(user_id, 'opening_balance', wallet_balance, user_id))
+    return {'Authorization': f"Bearer tok_{user_id}"}
+
+
+async def seed_coupon(coupon_id: str, seller_id: str = 'seller_1', status: str = 'approved', **fields) -> dict:
+    """Insert a listing built the way the create path builds it; fields override the CouponCreate defaults"""
+    coupon = server.CouponCreate(**{
+        'brand_name': 'Nike', 'coupon_code': f"CODE{coupon_id.upper().replace('_', '')}", 'expiry_date': '2099-12-31',
+        'coupon_value': 50, 'asking_price': 30, **fields
+    })
+    verdict = {'risk_score': 'low', 'feedback': 'ok', 'issues': [], 'recommendation': 'approve'}
+    doc = server.coupon_listing_doc(coupon_id, seller_id, coupon, verdict)
+    doc['status'] = status
+    if status not in server.LIVE_COUPON_STATUSES:
+        doc.pop('live_fingerprint', None)
+    await server.db.coupons.insert_one(doc)
+    return doc
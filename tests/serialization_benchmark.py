@@ -0,0 +1,137 @@
+"""Micro-benchmark: per-row cost of serializing listing responses.
+
+Compares the paths a page of coupons can take from Mongo rows to a JSON body:
+
+  model+response_model  Coupon(**row) per row, then FastAPI's response_model
+                        validation and JSONResponse rendering (uncached routes)
+  model+jsonable        Coupon(**row) per row, then jsonable_encoder and
+                        json.dumps (how cached bodies used to be built)
+  dump_response         projected rows encoded directly by pydantic-core
+
+No database is needed; rows are built with the same helpers the write path
+uses, so they have the stored shape.
+
+    python -m tests.serialization_benchmark --rows 20 200 1000 --out serialization.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+
+def load_server():
+    os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    os.environ.setdefault('DB_NAME', 'serialization_benchmark')
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    return server
+
+
+def stored_rows(server, count):
+    """Coupon documents as find({}, {'_id': 0}) returns them, plus their projected public form"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    verdict = {'risk_score': 'low', 'feedback': 'Coupon looks legitimate', 'issues': [], 'recommendation': 'approve'}
+    full, projected = [], []
+    for i in range(count):
+        coupon = server.CouponCreate(
+            brand_name=['Amazon', 'Nike', 'Uber Eats'][i % 3],
+            coupon_code=f"SAVE{i:08d}",
+            expiry_date='2099-01-01',
+            coupon_value=50.0,
+            asking_price=35.0 + i % 10
+        )
+        doc = server.coupon_listing_doc(f"cpn_{i:012d}", f"user_{i % 40:08d}", coupon, verdict)
+        doc['created_at'] = doc['updated_at'] = now - timedelta(seconds=i)
+        doc['expires_at'] = doc['expires_at'].replace(tzinfo=None)
+        full.append({**doc, 'coupon_code': doc['masked_code']})
+        projected.append({
+            name: (doc['masked_code'] if name == 'coupon_code' else doc[name])
+            for name in server.Coupon.model_fields if name in doc
+        })
+    return full, projected
+
+
+def run_to_completion(coro):
+    """Drive a coroutine that never actually suspends, without event loop overhead in the timing"""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError('coroutine suspended')
+
+
+def make_paths(server):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    response_field = create_response_field(name='Response_get_coupons', type_=List[server.Coupon])
+
+    def model_response_model(full, projected):
+        content = [server.Coupon(**row) for row in full]
+        return JSONResponse(run_to_completion(serialize_response(field=response_field, response_content=content))).body
+
+    def model_jsonable(full, projected):
+        content = [server.Coupon(**row) for row in full]
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+    def direct(full, projected):
+        return server.dump_response(server.Coupon, projected)
+
+    return {'model+response_model': model_response_model, 'model+jsonable': model_jsonable, 'dump_response': direct}
+
+
+def measure(fn, full, projected, repeat):
+    fn(full, projected)
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(full, projected)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[20, 200, 1000])
+    parser.add_argument('--repeat', type=int, default=50, help='Timed runs per size; the fastest is reported')
+    parser.add_argument('--out', help='Write results as JSON')
+    args = parser.parse_args(argv)
+
+    server = load_server()
+    paths = make_paths(server)
+    results = []
+    for count in args.rows:
+        full, projected = stored_rows(server, count)
+        same = json.loads(paths['model+jsonable'](full, projected)) == json.loads(paths['dump_response'](full, projected))
+        timings = {name: measure(fn, full, projected, args.repeat) for name, fn in paths.items()}
+        baseline = timings['model+response_model']
+        for name, seconds in timings.items():
+            results.append({
+                'rows': count,
+                'path': name,
+                'us_per_row': round(1e6 * seconds / count, 3),
+                'speedup': round(baseline / seconds, 2),
+                'identical_json': same
+            })
+
+    print(f"{'rows':>6s}  {'path':22s} {'us/row':>9s} {'speedup':>8s}")
+    for row in results:
+        print(f"{row['rows']:6d}  {row['path']:22s} {row['us_per_row']:9.2f} {row['speedup']:7.2f}x")
+    if not all(row['identical_json'] for row in results):
+        print("warning: dump_response output differs from the model path")
+    if args.out:
+        Path(args.out).write_text(json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
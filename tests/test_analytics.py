@@ -0,0 +1,70 @@
+"""Analytics rollups: $inc bookkeeping on write paths and the reconcile that corrects drift"""
+import logging
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from tests.conftest import seed_coupon, seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_first_build_against_existing_data_is_silent(app, caplog):
+    await seed_user('buyer_1')
+    await seed_coupon('cpn_1')
+    await server.db.analytics_counters.delete_many({})
+
+    with caplog.at_level(logging.INFO, logger='server'):
+        await server.ensure_analytics_rollups()
+
+    assert not [r for r in caplog.records if r.levelno >= logging.WARNING]
+    counters = await server.db.analytics_counters.find_one({'_id': 'global'})
+    assert (counters['total_users'], counters['total_coupons'], counters['coupons_approved']) == (1, 1, 1)
+
+
+async def test_reconcile_keeps_increments_that_land_while_it_recounts(app, monkeypatch):
+    await seed_user('buyer_1')
+    await server.db.analytics_counters.update_one({'_id': 'global'}, {'$inc': {'total_users': 5}})
+    compute_analytics = server.compute_analytics
+
+    async def compute_then_sign_up():
+        result = await compute_analytics()
+        await seed_user('buyer_2')
+        await server.record_analytics({'total_users': 1})
+        return result
+
+    monkeypatch.setattr(server, 'compute_analytics', compute_then_sign_up)
+    report = await server.reconcile_analytics()
+
+    assert report['drift'] == {'total_users': {'stored': 5, 'actual': 1}}
+    assert (await server.db.analytics_counters.find_one({'_id': 'global'}))['total_users'] == 2
+
+
+async def test_sale_is_counted_once_even_if_the_first_increment_fails(app, monkeypatch):
+    await seed_coupon('cpn_1')
+    payment = {
+        'payment_id': 'pmt_1', 'user_id': 'buyer_1', 'coupon_id': 'cpn_1', 'seller_id': 'seller_1',
+        'session_id': 'cs_1', 'amount': 40.0, 'currency': 'usd', 'payment_status': 'pending',
+        'created_at': datetime.now(timezone.utc)
+    }
+    await server.db.payment_transactions.insert_one(dict(payment))
+    record_analytics = server.record_analytics
+
+    async def unavailable(*args, **kwargs):
+        raise RuntimeError('analytics write failed')
+
+    monkeypatch.setattr(server, 'record_analytics', unavailable)
+    with pytest.raises(RuntimeError):
+        await server.settle_checkout(payment)
+
+    monkeypatch.setattr(server, 'record_analytics', record_analytics)
+    await server.settle_checkout(payment)
+    await server.settle_checkout(payment)
+
+    counters = await server.db.analytics_counters.find_one({'_id': 'global'})
+    assert (counters['total_transactions'], counters['total_sales']) == (1, 40.0)
+    assert await server.db.transactions.count_documents({'session_id': 'cs_1'}) == 1
+    assert await server.db.transactions.count_documents({'analytics_pending': True}) == 0
+    drift = (await server.reconcile_analytics(apply=False))['drift']
+    assert 'total_transactions' not in drift and 'total_sales' not in drift
@@ -0,0 +1,102 @@
+"""Bulk listing upload: per-row outcomes, limits and parsing off the event loop"""
+import json
+import threading
+
+import pytest
+
+import server
+from tests.conftest import seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+def listing(code: str, **fields) -> dict:
+    return {'brand_name': 'Nike', 'coupon_code': code, 'expiry_date': '2099-12-31', 'coupon_value': 50, 'asking_price': 30, **fields}
+
+
+async def upload(api, name: str, content: str, content_type: str):
+    headers = await seed_user('seller_1', role='seller')
+    return await api.post('/api/coupons/bulk', files={'file': (name, content, content_type)}, headers=headers)
+
+
+async def test_csv_rows_are_reported_one_by_one_across_chunks(api, monkeypatch):
+    monkeypatch.setattr(server, 'BULK_UPLOAD_CHUNK_SIZE', 2)
+    content = '\n'.join([
+        'brand_name,coupon_code,expiry_date,coupon_value,asking_price',
+        'Nike,SAVE20NOW,2099-12-31,50,30',
+        'Nike,MISSINGVALUE,2099-12-31,,30',
+        'Nike,save-20 now,2099-12-31,50,30',
+        'Nike,PRICEY1234,2099-12-31,50,80',
+        'Nike,OTHERCODE1,Dec 2099,50,30',
+    ])
+
+    response = await upload(api, 'listings.csv', content, 'text/csv')
+
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert [(r['row'], r['status']) for r in results] == [(1, 'pending'), (2, 'error'), (3, 'error'), (4, 'rejected'), (5, 'pending')]
+    assert results[1]['error'] == 'coupon_value: Field required'
+    assert results[2]['error'] == 'Duplicate of row 1 in this upload'
+    assert response.json()['summary'] == {'pending': 2, 'error': 2, 'rejected': 1}
+    assert await server.db.coupons.count_documents({}) == 3
+
+
+async def test_ndjson_skips_blank_lines_and_reports_undecodable_ones(api):
+    content = '\n'.join([json.dumps(listing('SAVE20NOW')), '', '{"brand_name": "Nike",', '[1, 2]', json.dumps(listing('OTHERCODE1'))])
+
+    response = await upload(api, 'listings.ndjson', content, 'application/x-ndjson')
+
+    assert [(r['row'], r['status']) for r in response.json()['results']] == [(1, 'pending'), (2, 'error'), (3, 'error'), (4, 'pending')]
+    assert response.json()['results'][1]['error'] == 'Row could not be decoded as a coupon object'
+
+
+async def test_json_array_that_breaks_part_way_keeps_the_rows_before_it(api):
+    content = json.dumps([listing('SAVE20NOW'), listing('OTHERCODE1')])[:-1] + ', {"brand_name": '
+
+    response = await upload(api, 'listings.json', content, 'application/json')
+
+    assert [(r['row'], r['status']) for r in response.json()['results']] == [(1, 'pending'), (2, 'pending'), (3, 'error')]
+
+
+async def test_upload_that_is_not_a_json_array_is_refused(api):
+    response = await upload(api, 'listings.json', json.dumps(listing('SAVE20NOW')), 'application/json')
+
+    assert response.status_code == 400
+    assert await server.db.coupons.count_documents({}) == 0
+
+
+async def test_rows_past_the_limit_are_reported_and_not_processed(api, monkeypatch):
+    monkeypatch.setattr(server, 'BULK_UPLOAD_MAX_ROWS', 2)
+    content = '\n'.join(json.dumps(listing(f"CODE{i:06d}")) for i in range(5))
+
+    response = await upload(api, 'listings.ndjson', content, 'application/x-ndjson')
+
+    results = response.json()['results']
+    assert [(r['row'], r['status']) for r in results] == [(1, 'pending'), (2, 'pending'), (3, 'error')]
+    assert 'limited to 2 rows' in results[2]['error']
+    assert await server.db.coupons.count_documents({}) == 2
+
+
+async def test_upload_over_the_byte_limit_is_refused_before_parsing(api, monkeypatch):
+    monkeypatch.setattr(server, 'BULK_UPLOAD_MAX_BYTES', 100)
+
+    response = await upload(api, 'listings.json', json.dumps([listing(f"CODE{i:06d}") for i in range(5)]), 'application/json')
+
+    assert response.status_code == 413
+    assert await server.db.coupons.count_documents({}) == 0
+
+
+async def test_rows_are_parsed_off_the_event_loop(api, monkeypatch):
+    read_bulk_chunk = server.read_bulk_chunk
+    threads = []
+
+    def recording_read(rows, size):
+        threads.append(threading.current_thread())
+        return read_bulk_chunk(rows, size)
+
+    monkeypatch.setattr(server, 'read_bulk_chunk', recording_read)
+    monkeypatch.setattr(server, 'BULK_UPLOAD_CHUNK_SIZE', 1)
+    response = await upload(api, 'listings.ndjson', '\n'.join(json.dumps(listing(f"CODE{i:06d}")) for i in range(3)), 'application/x-ndjson')
+
+    assert response.json()['summary'] == {'pending': 3}
+    assert threads and threading.main_thread() not in threads
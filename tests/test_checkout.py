@@ -0,0 +1,45 @@
+"""Checkout settlement under concurrent status polls"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from emergentintegrations.payments.stripe.checkout import CheckoutStatusResponse
+
+import server
+from tests.conftest import seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+class PaidStripeCheckout:
+    """Stand-in for StripeCheckout that reports every session as paid"""
+
+    def __init__(self, api_key=None, webhook_url=None):
+        self.webhook_url = webhook_url
+
+    async def get_checkout_status(self, session_id):
+        await asyncio.sleep(0)
+        return CheckoutStatusResponse(status='complete', payment_status='paid', amount_total=4000, currency='usd', metadata={})
+
+
+async def test_concurrent_status_polls_settle_exactly_once(api, monkeypatch):
+    monkeypatch.setattr(server.outbound, 'stripe_factory', PaidStripeCheckout)
+    headers = await seed_user('buyer_1')
+    coupon = server.CouponCreate(brand_name='Nike', coupon_code='SAVE20NOW', expiry_date='2099-12-31', coupon_value=50, asking_price=40)
+    verdict = {'risk_score': 'low', 'feedback': 'ok', 'issues': [], 'recommendation': 'approve'}
+    await server.db.coupons.insert_one(server.coupon_listing_doc('cpn_1', 'seller_1', coupon, verdict))
+    await server.db.payment_transactions.insert_one({
+        'payment_id': 'pmt_1', 'user_id': 'buyer_1', 'coupon_id': 'cpn_1', 'seller_id': 'seller_1',
+        'session_id': 'cs_1', 'amount': 40.0, 'currency': 'usd', 'payment_status': 'pending',
+        'created_at': datetime.now(timezone.utc)
+    })
+
+    responses = await asyncio.gather(*(api.get('/api/checkout/status/cs_1', headers=headers) for _ in range(10)))
+
+    assert [r.status_code for r in responses] == [200] * 10
+    assert {r.json()['payment_status'] for r in responses} == {'paid'}
+    transactions = await server.db.transactions.find({'session_id': 'cs_1'}).to_list(None)
+    assert len(transactions) == 1
+    assert transactions[0]['status'] == 'escrow'
+    assert transactions[0]['amount'] == 40.0
+    assert (await server.db.coupons.find_one({'coupon_id': 'cpn_1'}))['status'] == 'sold'
@@ -0,0 +1,49 @@
+"""One live listing per coupon code, however the code is typed"""
+import pytest
+
+import server
+from tests.conftest import seed_coupon, seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+def listing(code: str) -> dict:
+    return {'brand_name': 'Nike', 'coupon_code': code, 'expiry_date': '2099-12-31', 'coupon_value': 50, 'asking_price': 30}
+
+
+@pytest.mark.parametrize('code', ['save20now', 'SAVE-20-NOW', 'save 20 now', ' Save_20_Now '])
+async def test_reformatted_code_is_rejected_as_already_listed(api, code):
+    await seed_coupon('cpn_1', coupon_code='SAVE20NOW')
+    headers = await seed_user('seller_2', role='seller')
+
+    response = await api.post('/api/coupons', json=listing(code), headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()['status'] == 'rejected'
+    assert response.json()['ai_feedback'] == 'Rejected by pre-screen: Coupon code is already listed'
+
+
+async def test_code_can_be_relisted_once_the_old_listing_is_no_longer_live(api):
+    await seed_coupon('cpn_1', status='expired', coupon_code='SAVE20NOW')
+    headers = await seed_user('seller_2', role='seller')
+
+    response = await api.post('/api/coupons', json=listing('save-20-now'), headers=headers)
+
+    assert response.json()['status'] == 'pending'
+
+
+async def test_unique_index_catches_a_duplicate_the_prescreen_read_missed(api, monkeypatch):
+    await seed_coupon('cpn_1', coupon_code='SAVE20NOW')
+    headers = await seed_user('seller_2', role='seller')
+    # As if the listing landed between the pre-screen lookup and this insert
+    reject_rules = [rule for rule in server.coupon_prescreen.reject_rules if rule is not server.rule_code_not_listed]
+    monkeypatch.setattr(server.coupon_prescreen, 'reject_rules', reject_rules)
+
+    response = await api.post('/api/coupons', json=listing('save 20 now'), headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()['status'] == 'rejected'
+    assert response.json()['ai_feedback'] == server.DUPLICATE_CODE_VERDICT['feedback']
+    rejected = await server.db.coupons.find_one({'coupon_id': response.json()['coupon_id']})
+    assert 'live_fingerprint' not in rejected
+    assert await server.db.coupons.count_documents({'live_fingerprint': {'$exists': True}}) == 1
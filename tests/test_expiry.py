@@ -0,0 +1,104 @@
+"""Parsing seller-entered expiry dates into expires_at"""
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from tests.conftest import seed_coupon, seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('expiry_date, expires_at', [
+    ('2027-12-31', utc(2028, 1, 1)),
+    ('2027-12-31T18:00:00+00:00', utc(2027, 12, 31, 18)),
+    ('2027/12/31', utc(2028, 1, 1)),
+    ('2027.12.31', utc(2028, 1, 1)),
+    ('31 Dec 2027', utc(2028, 1, 1)),
+    ('31 December 2027', utc(2028, 1, 1)),
+    ('Dec 31, 2027', utc(2028, 1, 1)),
+    ('December 31, 2027', utc(2028, 1, 1)),
+    ('31st Dec 2027', utc(2028, 1, 1)),
+    ('12/31/2027', utc(2028, 1, 1)),
+    ('31/12/2027', utc(2028, 1, 1)),
+    ('12-31-2027', utc(2028, 1, 1)),
+    ('31-12-2027', utc(2028, 1, 1)),
+    ('31.12.2027', utc(2028, 1, 1)),
+    ('12/31/27', utc(2028, 1, 1)),
+    ('31/12/27', utc(2028, 1, 1)),
+    ('03/04/2027', utc(2027, 3, 5)),
+    ('12/2027', utc(2028, 1, 1)),
+    ('02-2028', utc(2028, 3, 1)),
+    ('2027-02', utc(2027, 3, 1)),
+    ('Feb 2028', utc(2028, 3, 1)),
+    ('February 2027', utc(2027, 3, 1)),
+    ('No expiry', None),
+    ('', None),
+])
+def test_expiry_formats(expiry_date, expires_at):
+    assert server.coupon_expires_at(expiry_date) == expires_at
+
+
+@pytest.mark.parametrize('expiry_date, expires_at', [
+    ('Dec 2099', datetime(2100, 1, 1)),
+    ('No expiry', None),
+])
+async def test_listing_stores_parsed_expiry_and_accepts_unrecognised_dates(api, expiry_date, expires_at):
+    headers = await seed_user('seller_1', role='seller')
+    listing = {'brand_name': 'Nike', 'coupon_code': 'SAVE20NOW', 'expiry_date': expiry_date, 'coupon_value': 50, 'asking_price': 30}
+
+    response = await api.post('/api/coupons', json=listing, headers=headers)
+
+    assert response.status_code == 200
+    coupon = await server.db.coupons.find_one({'coupon_id': response.json()['coupon_id']})
+    assert coupon['expiry_date'] == expiry_date
+    assert coupon['expires_at'] == expires_at
+
+
+async def test_backfill_parses_legacy_rows_and_skips_unparseable_ones_afterwards(app):
+    await server.db.coupons.insert_many([
+        {'coupon_id': 'cpn_1', 'status': 'approved', 'expiry_date': 'Dec 2027'},
+        {'coupon_id': 'cpn_2', 'status': 'sold', 'expiry_date': '31/12/2027'},
+        {'coupon_id': 'cpn_3', 'status': 'approved', 'expiry_date': 'No expiry'},
+    ])
+
+    await server.backfill_expiry_dates(batch_size=1)
+
+    coupons = {c['coupon_id']: c async for c in server.db.coupons.find({})}
+    assert coupons['cpn_1']['expires_at'] == datetime(2028, 1, 1)
+    assert coupons['cpn_2']['expires_at'] == datetime(2028, 1, 1)
+    assert coupons['cpn_3']['expires_at'] is None
+    assert coupons['cpn_3']['expires_at_unparsed'] is True
+
+    await server.db.coupons.update_one({'coupon_id': 'cpn_3'}, {'$set': {'expiry_date': '2027-12-31'}})
+    await server.backfill_expiry_dates()
+    assert (await server.db.coupons.find_one({'coupon_id': 'cpn_3'}))['expires_at'] is None
+
+
+async def test_listings_and_search_leave_out_lapsed_and_undated_coupons(api):
+    await seed_coupon('cpn_valid', expiry_date='2099-12-31')
+    await seed_coupon('cpn_undated', expiry_date='No expiry')
+    await seed_coupon('cpn_lapsed', expiry_date='2020-01-31')
+
+    listed = await api.get('/api/coupons')
+    searched = await api.get('/api/coupons/search')
+
+    assert [c['coupon_id'] for c in listed.json()] == ['cpn_valid']
+    assert [c['coupon_id'] for c in searched.json()['results']] == ['cpn_valid']
+
+
+async def test_sweeper_expires_only_lapsed_approved_coupons(app):
+    await seed_coupon('cpn_valid', expiry_date='2099-12-31')
+    await seed_coupon('cpn_undated', expiry_date='No expiry')
+    await seed_coupon('cpn_lapsed', expiry_date='Jan 2020')
+    await seed_coupon('cpn_sold', expiry_date='2020-01-31', status='sold')
+
+    assert await server.sweep_expired_coupons(batch_size=1) == 1
+
+    statuses = {c['coupon_id']: c['status'] async for c in server.db.coupons.find({})}
+    assert statuses == {'cpn_valid': 'approved', 'cpn_undated': 'approved', 'cpn_lapsed': 'expired', 'cpn_sold': 'sold'}
+    assert 'live_fingerprint' not in await server.db.coupons.find_one({'coupon_id': 'cpn_lapsed'})
@@ -0,0 +1,59 @@
+"""Keyset pagination of the public coupon list"""
+import pytest
+
+from tests.conftest import seed_coupon
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed_listings():
+    # Few distinct prices, values and expiries so every sort has long runs of ties
+    for i in range(13):
+        await seed_coupon(f"cpn_{i:02d}", asking_price=[20, 30, 40][i % 3], coupon_value=[50, 60][i % 2],
+                          expiry_date=['2099-06-30', '2099-12-31'][i % 2])
+
+
+async def walk_pages(api, params: dict) -> tuple:
+    """Follow X-Next-Cursor from the first page to the last; returns (ids in page order, page count)"""
+    ids, pages, cursor = [], 0, None
+    while True:
+        response = await api.get('/api/coupons', params={**params, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids.extend(coupon['coupon_id'] for coupon in response.json())
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids, pages
+
+
+@pytest.mark.parametrize('sort', ['newest', 'price_asc', 'price_desc', 'discount', 'expiring'])
+async def test_pages_have_no_duplicates_or_gaps(api, sort):
+    await seed_listings()
+
+    everything = [coupon['coupon_id'] for coupon in (await api.get('/api/coupons', params={'sort': sort, 'limit': 100})).json()]
+    ids, pages = await walk_pages(api, {'sort': sort, 'limit': 4})
+
+    assert len(everything) == 13
+    assert ids == everything
+    assert pages == 4
+
+
+async def test_listing_added_between_pages_does_not_shift_later_pages(api):
+    await seed_listings()
+    first = await api.get('/api/coupons', params={'sort': 'price_asc', 'limit': 4})
+    seen = [coupon['coupon_id'] for coupon in first.json()]
+
+    await seed_coupon('cpn_new', asking_price=10)
+    rest, _ = await walk_pages(api, {'sort': 'price_asc', 'limit': 4, 'cursor': first.headers['X-Next-Cursor']})
+
+    assert not set(seen) & set(rest)
+    assert sorted(seen + rest) == [f"cpn_{i:02d}" for i in range(13)]
+
+
+async def test_cursor_from_another_sort_is_refused(api):
+    await seed_listings()
+    cursor = (await api.get('/api/coupons', params={'sort': 'price_asc', 'limit': 4})).headers['X-Next-Cursor']
+
+    response = await api.get('/api/coupons', params={'sort': 'price_desc', 'limit': 4, 'cursor': cursor})
+    assert response.status_code == 400
+    assert (await api.get('/api/coupons', params={'cursor': 'not-a-cursor'})).status_code == 400
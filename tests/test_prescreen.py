@@ -0,0 +1,83 @@
+"""Deterministic pre-screen rules run ahead of the LLM validator"""
+import pytest
+
+import server
+from tests.conftest import seed_coupon
+
+pytestmark = pytest.mark.anyio
+
+
+def make_coupon(**fields) -> server.CouponCreate:
+    return server.CouponCreate(**{
+        'brand_name': 'Nike', 'coupon_code': 'SAVE20NOW', 'expiry_date': '2099-12-31', 'coupon_value': 50, 'asking_price': 30, **fields
+    })
+
+
+def make_prescreen() -> server.CouponPrescreen:
+    return server.CouponPrescreen(
+        reject_rules=server.coupon_prescreen.reject_rules,
+        flag_rules=server.coupon_prescreen.flag_rules,
+        approve_rule=server.coupon_prescreen.approve_rule
+    )
+
+
+@pytest.mark.parametrize('fields, issue, rule', [
+    ({'asking_price': 60}, 'Asking price exceeds coupon value', 'rule_price_sanity'),
+    ({'coupon_value': 0}, 'Coupon value and asking price must be positive', 'rule_price_sanity'),
+    ({'expiry_date': '2001-01-31'}, 'Coupon has already expired', 'rule_expiry_not_past'),
+    ({'expiry_date': '01/2001'}, 'Coupon has already expired', 'rule_expiry_not_past'),
+    ({'coupon_code': '- _ -'}, 'Coupon code is malformed', 'rule_code_format'),
+    ({'coupon_code': 'A' * 65}, 'Coupon code is malformed', 'rule_code_format'),
+    ({'coupon_code': 'SAVE\x0020'}, 'Coupon code is malformed', 'rule_code_format'),
+])
+async def test_reject_rules(app, fields, issue, rule):
+    prescreen = make_prescreen()
+
+    verdict, flags = await prescreen.evaluate(make_coupon(**fields))
+
+    assert (verdict['recommendation'], verdict['issues'], verdict['rule']) == ('reject', [issue], rule)
+    assert flags == []
+    assert prescreen.stats()['rejected'] == 1
+
+
+async def test_unreadable_expiry_is_left_to_the_validator(app):
+    verdict, flags = await make_prescreen().evaluate(make_coupon(expiry_date='whenever'))
+
+    assert (verdict, flags) == (None, [])
+
+
+@pytest.mark.parametrize('code', ['SAVE 20%', 'ÉTÉ2099', 'XYZ'])
+async def test_unusual_code_is_flagged_not_rejected(app, code):
+    verdict, flags = await make_prescreen().evaluate(make_coupon(coupon_code=code))
+
+    assert verdict is None
+    assert flags == ['Coupon code has an unusual length or characters']
+
+
+async def test_similar_code_for_the_same_brand_is_flagged(app):
+    await seed_coupon('cpn_1', coupon_code='SUMMER2099A')
+
+    verdict, flags = await make_prescreen().evaluate(make_coupon(coupon_code='SUMMER2099B'))
+
+    assert verdict is None
+    assert flags == ['A code with the same prefix is already listed for this brand (cpn_1)']
+
+
+async def test_auto_approve_is_off_by_default(app):
+    prescreen = make_prescreen()
+
+    assert await prescreen.evaluate(make_coupon(coupon_value=10, asking_price=5)) == (None, [])
+    assert prescreen.stats()['escalated'] == 1
+
+
+async def test_auto_approve_settles_small_clean_coupons_when_enabled(app, monkeypatch):
+    monkeypatch.setattr(server, 'PRESCREEN_AUTO_APPROVE_MAX_VALUE', 20.0)
+    prescreen = make_prescreen()
+
+    verdict, _ = await prescreen.evaluate(make_coupon(coupon_value=10, asking_price=5))
+    assert (verdict['recommendation'], verdict['rule']) == ('approve', 'rule_auto_approve')
+    # Too valuable, too close to face value, or flagged: still escalated
+    assert (await prescreen.evaluate(make_coupon(coupon_value=50, asking_price=5)))[0] is None
+    assert (await prescreen.evaluate(make_coupon(coupon_value=10, asking_price=10)))[0] is None
+    assert (await prescreen.evaluate(make_coupon(coupon_value=10, asking_price=5, coupon_code='XYZ')))[0] is None
+    assert prescreen.stats()['llm_calls_saved'] == 1
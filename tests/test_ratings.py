@@ -0,0 +1,48 @@
+"""Seller and coupon rating aggregates kept alongside reviews"""
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from tests.conftest import seed_coupon, seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def insert_review(review_id: str, coupon_id: str, rating: int, seller_id: str = 'seller_1'):
+    await server.db.reviews.insert_one({
+        'review_id': review_id, 'buyer_id': 'buyer_1', 'coupon_id': coupon_id, 'seller_id': seller_id,
+        'rating': rating, 'comment': None, 'created_at': datetime.now(timezone.utc)
+    })
+
+
+async def test_review_is_folded_into_seller_and_coupon_ratings(api):
+    await seed_coupon('cpn_1')
+    headers = await seed_user('buyer_1')
+    await server.db.transactions.insert_one({'transaction_id': 'txn_1', 'coupon_id': 'cpn_1', 'buyer_id': 'buyer_1', 'seller_id': 'seller_1'})
+
+    response = await api.post('/api/reviews', json={'coupon_id': 'cpn_1', 'rating': 4}, headers=headers)
+    assert response.status_code == 200
+
+    coupon = (await api.get('/api/coupons')).json()[0]
+    assert (coupon['rating'], coupon['review_count']) == (4, 1)
+    assert (coupon['seller_rating'], coupon['seller_review_count']) == (4, 1)
+
+
+async def test_reconcile_restores_a_rating_whose_increment_was_lost(app):
+    await insert_review('rev_1', 'cpn_1', 5)
+    await server.record_review_rating('seller_1', 'cpn_1', 5)
+    # A crash between the review insert and its $inc
+    await insert_review('rev_2', 'cpn_2', 2)
+    # And an aggregate left behind by a review that no longer exists
+    await server.record_review_rating('seller_1', 'cpn_3', 1)
+
+    assert await server.reconcile_rating_aggregates() == {'corrected': 3}
+
+    stored = {doc['_id']: server.rating_fields(doc) async for doc in server.db.rating_aggregates.find({'count': {'$gt': 0}})}
+    actual = {key: server.rating_fields(aggregate) for key, aggregate in (await server.compute_rating_aggregates()).items()}
+    assert stored == actual
+    assert stored['seller:seller_1'] == {
+        'count': 2, 'sum': 7, 'histogram.1': 0, 'histogram.2': 1, 'histogram.3': 0, 'histogram.4': 0, 'histogram.5': 1
+    }
+    assert await server.reconcile_rating_aggregates() == {'corrected': 0}
@@ -0,0 +1,48 @@
+"""The public read-endpoint response cache: keys, ETag revalidation and invalidation on writes"""
+import pytest
+
+import server
+from tests.conftest import seed_coupon, seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_encoded_separators_in_a_value_do_not_share_a_cache_key(api):
+    for i, price in enumerate((30, 10, 20)):
+        await seed_coupon(f"cpn_{i}", asking_price=price)
+
+    crafted = await api.get('/api/coupons?brand=nike%26sort%3Dprice_asc')
+    assert crafted.status_code == 200
+    assert crafted.json() == []
+
+    response = await api.get('/api/coupons?brand=nike&sort=price_asc')
+    assert [c['asking_price'] for c in response.json()] == [10, 20, 30]
+
+
+async def test_matching_etag_is_answered_with_304(api):
+    await seed_coupon('cpn_1')
+
+    first = await api.get('/api/coupons')
+    etag = first.headers['etag']
+    revalidated = await api.get('/api/coupons', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b''
+    assert revalidated.headers['etag'] == etag
+
+    stale = await api.get('/api/coupons', headers={'If-None-Match': '"not-the-etag"'})
+    assert stale.status_code == 200
+    assert stale.json() == first.json()
+
+
+async def test_new_review_invalidates_cached_reviews(api):
+    await seed_coupon('cpn_1', status='sold')
+    headers = await seed_user('buyer_1')
+    await server.db.transactions.insert_one({'transaction_id': 'txn_1', 'coupon_id': 'cpn_1', 'buyer_id': 'buyer_1', 'seller_id': 'seller_1'})
+
+    assert (await api.get('/api/reviews/cpn_1')).json() == []
+    assert (await api.get('/api/reviews/cpn_1')).json() == []
+    created = await api.post('/api/reviews', json={'coupon_id': 'cpn_1', 'rating': 4, 'comment': 'Worked'}, headers=headers)
+    assert created.status_code == 200
+
+    reviews = (await api.get('/api/reviews/cpn_1')).json()
+    assert [(r['rating'], r['comment']) for r in reviews] == [(4, 'Worked')]
@@ -0,0 +1,36 @@
+"""Session token -> User cache and its invalidation"""
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def make_user(role: str = 'buyer') -> server.User:
+    return server.User(user_id='user_1', email='user_1@test.example.com', name='user_1', role=role,
+                       created_at=datetime.now(timezone.utc))
+
+
+def test_lookup_that_raced_an_invalidation_is_not_cached():
+    cache = server.SessionCache(maxsize=10, ttl=60)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+
+    # The lookup reads its generation and the old row, then the role change invalidates
+    generation = cache.generation('user_1')
+    stale = make_user(role='buyer')
+    cache.invalidate_user('user_1')
+    cache.put('tok_1', stale, expires_at, generation)
+    assert cache.get('tok_1') is None
+
+    cache.put('tok_1', make_user(role='admin'), expires_at, cache.generation('user_1'))
+    assert cache.get('tok_1').role == 'admin'
+
+
+def test_invalidate_user_drops_every_session_of_that_user():
+    cache = server.SessionCache(maxsize=10, ttl=60)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+    for token in ('tok_1', 'tok_2'):
+        cache.put(token, make_user(), expires_at, cache.generation('user_1'))
+
+    cache.invalidate_user('user_1')
+
+    assert cache.get('tok_1') is None
+    assert cache.get('tok_2') is None
@@ -0,0 +1,111 @@
+"""The Mongo-backed AI validation queue: enqueue, worker processing, retry backoff and manual-review fallback"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from tests.conftest import seed_user
+
+pytestmark = pytest.mark.anyio
+
+LISTING = {
+    'brand_name': 'Nike',
+    'coupon_code': 'SAVE20NOW',
+    'expiry_date': '2099-12-31',
+    'coupon_value': 50,
+    'asking_price': 30
+}
+
+
+async def failing_send_message(self, message):
+    raise RuntimeError('LLM unavailable')
+
+
+async def enqueue_listing(coupon_id: str = 'cpn_queue') -> server.CouponCreate:
+    coupon = server.CouponCreate(**LISTING)
+    await server.db.coupons.insert_one(server.coupon_listing_doc(coupon_id, 'seller_1', coupon, None))
+    await server.enqueue_validation_job(coupon_id, coupon)
+    return coupon
+
+
+async def claim_now() -> dict:
+    """Make every queued job due, then claim one"""
+    await server.db.validation_jobs.update_many({'status': 'queued'}, {'$set': {'next_attempt_at': datetime.now(timezone.utc)}})
+    return await server.claim_validation_job()
+
+
+async def test_worker_validates_listing_created_through_the_api(api, monkeypatch):
+    pool = server.ValidationWorkerPool(size=1)
+    monkeypatch.setattr(server, 'validation_workers', pool)
+    headers = await seed_user('seller_1', role='seller')
+
+    response = await api.post('/api/coupons', json=LISTING, headers=headers)
+    assert response.status_code == 200
+    coupon_id = response.json()['coupon_id']
+    assert response.json()['status'] == 'pending'
+
+    pool.start()
+    for _ in range(200):
+        job = await server.db.validation_jobs.find_one({'coupon_id': coupon_id})
+        if job['status'] == 'done':
+            break
+        await asyncio.sleep(0.01)
+
+    assert job['status'] == 'done'
+    assert job['attempts'] == 1
+    assert job['locked_at'] is None
+    coupon = await server.db.coupons.find_one({'coupon_id': coupon_id})
+    assert coupon['status'] == 'approved'
+    assert coupon['ai_risk_score'] == 'low'
+    logs = await server.db.ai_validation_logs.find({'coupon_id': coupon_id}).to_list(None)
+    assert [log['risk_score'] for log in logs] == ['low']
+    assert pool.stats()['completed'] == 1
+
+
+async def test_failed_call_is_requeued_with_exponential_backoff(app, monkeypatch):
+    monkeypatch.setattr(server.FakeLlmChat, 'send_message', failing_send_message)
+    pool = server.ValidationWorkerPool(size=0)
+    await enqueue_listing()
+
+    delays = []
+    for attempt in (1, 2, 3):
+        job = await claim_now()
+        assert job['attempts'] == attempt
+        started = datetime.now(timezone.utc)
+        await pool._process(job)
+
+        job = await server.db.validation_jobs.find_one({'job_id': job['job_id']})
+        assert job['status'] == 'queued'
+        assert job['locked_at'] is None
+        assert job['last_error'] == 'LLM unavailable'
+        delays.append((job['next_attempt_at'].replace(tzinfo=timezone.utc) - started).total_seconds())
+
+    base = server.VALIDATION_RETRY_BASE
+    for delay, expected in zip(delays, (base, base * 2, base * 4)):
+        assert expected - 0.5 < delay <= expected + 0.5
+    assert pool.stats()['retried'] == 3
+    assert (await server.db.coupons.find_one({'coupon_id': 'cpn_queue'}))['status'] == 'pending'
+    assert await server.db.ai_validation_logs.count_documents({}) == 0
+
+
+async def test_job_falls_back_to_manual_review_after_max_attempts(app, monkeypatch):
+    monkeypatch.setattr(server.FakeLlmChat, 'send_message', failing_send_message)
+    monkeypatch.setattr(server, 'VALIDATION_MAX_ATTEMPTS', 3)
+    pool = server.ValidationWorkerPool(size=0)
+    await enqueue_listing()
+
+    for _ in range(3):
+        await pool._process(await claim_now())
+
+    job = await server.db.validation_jobs.find_one({'coupon_id': 'cpn_queue'})
+    assert job['status'] == 'failed'
+    assert job['attempts'] == 3
+    assert job['result'] == server.FALLBACK_VALIDATION
+    assert await claim_now() is None
+    coupon = await server.db.coupons.find_one({'coupon_id': 'cpn_queue'})
+    assert coupon['status'] == 'pending'
+    assert coupon['ai_feedback'] == server.FALLBACK_VALIDATION['feedback']
+    logs = await server.db.ai_validation_logs.find({'coupon_id': 'cpn_queue'}).to_list(None)
+    assert [log['validation_details'] for log in logs] == [server.FALLBACK_VALIDATION]
+    assert pool.stats() == {'workers': 0, 'completed': 0, 'retried': 2, 'failed': 1}
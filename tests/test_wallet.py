@@ -0,0 +1,81 @@
+"""Wallet debits under concurrent withdrawal requests"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.conftest import seed_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_withdrawals_never_overdraw(api):
+    headers = await seed_user('seller_1', role='seller', wallet_balance=100.0)
+
+    responses = await asyncio.gather(*(api.post('/api/wallet/withdraw', json={'amount': 40}, headers=headers) for _ in range(5)))
+
+    assert sorted(r.status_code for r in responses) == [200, 200, 400, 400, 400]
+    assert {r.json()['detail'] for r in responses if r.status_code == 400} == {'Insufficient balance'}
+    assert sorted(r.json()['wallet_balance'] for r in responses if r.status_code == 200) == [20.0, 60.0]
+    user = await server.db.users.find_one({'user_id': 'seller_1'})
+    assert user['wallet_balance'] == 20.0
+    assert await server.db.withdrawals.count_documents({'user_id': 'seller_1', 'status': 'pending'}) == 2
+    ledger = await server.db.wallet_ledger.find({'user_id': 'seller_1'}).to_list(None)
+    assert round(sum(entry['amount'] for entry in ledger), 2) == 20.0
+
+    wallet = await api.get('/api/wallet', headers=headers)
+    assert wallet.json()['wallet_balance'] == 20.0
+
+
+async def test_wallet_reads_balance_written_by_another_process(api):
+    headers = await seed_user('seller_1', role='seller', wallet_balance=100.0)
+    assert (await api.get('/api/wallet', headers=headers)).json()['wallet_balance'] == 100.0
+
+    # A credit applied elsewhere does not invalidate this process's session cache
+    await server.db.users.update_one({'user_id': 'seller_1'}, {'$inc': {'wallet_balance': 25.0}})
+
+    assert (await api.get('/api/wallet', headers=headers)).json()['wallet_balance'] == 125.0
+
+
+async def seed_credit(user_id: str, amount: float, state: str = 'pending', **fields) -> dict:
+    """A ledger credit written long enough ago for the recovery sweep to pick it up"""
+    created_at = datetime.now(timezone.utc) - timedelta(seconds=server.WALLET_RECOVERY_GRACE + 60)
+    entry = {**server.ledger_entry_doc(user_id, 'sale', amount, f"txn_{uuid.uuid4().hex[:12]}", created_at, state=state), **fields}
+    await server.db.wallet_ledger.insert_one(dict(entry))
+    return entry
+
+
+async def test_request_and_recovery_sweep_racing_credit_once(app):
+    await seed_user('seller_1', role='seller')
+    entry = await seed_credit('seller_1', 10.0)
+
+    # The sweep reads the entry as pending, then the slow request path finishes it
+    # (credit, done, id unparked) before the sweep acts on what it read
+    swept = await server.db.wallet_ledger.find_one({'entry_id': entry['entry_id']}, {'_id': 0})
+    await server.apply_ledger_credits([entry])
+    await server.apply_ledger_credits([swept])
+    await asyncio.gather(server.apply_ledger_credits([entry]), server.recover_wallet_credits())
+
+    user = await server.db.users.find_one({'user_id': 'seller_1'})
+    assert user['wallet_balance'] == 10.0
+    assert user['pending_credits'] == []
+    assert (await server.db.wallet_ledger.find_one({'entry_id': entry['entry_id']}))['state'] == 'done'
+
+
+@pytest.mark.parametrize('credited_before_crash', [False, True])
+async def test_recovery_finishes_a_claim_left_by_a_crash(app, credited_before_crash):
+    stale = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(seconds=server.WALLET_RECOVERY_GRACE + 60)
+    await seed_user('seller_1', role='seller', wallet_balance=10.0 if credited_before_crash else 0.0)
+    entry = await seed_credit('seller_1', 10.0, state='applied', applied_at=stale)
+    if credited_before_crash:
+        await server.db.users.update_one({'user_id': 'seller_1'}, {'$push': {'pending_credits': entry['entry_id']}})
+
+    await server.recover_wallet_credits()
+    await server.recover_wallet_credits()
+
+    user = await server.db.users.find_one({'user_id': 'seller_1'})
+    assert user['wallet_balance'] == 10.0
+    assert user['pending_credits'] == []
+    assert (await server.db.wallet_ledger.find_one({'entry_id': entry['entry_id']}))['state'] == 'done'